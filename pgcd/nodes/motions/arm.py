@@ -8,8 +8,9 @@ import drv8825
 import steppers
 import RPi.GPIO as GPIO
 import time
+import math
 import sympy as sp
-from multiprocessing import Process
+from concurrent.futures import ThreadPoolExecutor
 
 # TODO use steppers instead of drv8825
 
@@ -19,6 +20,8 @@ class arm():
 
     def __init__( self, motionOnSeparateThread = False ):
         self.motionOnSeparateThread = motionOnSeparateThread
+        # stepping is waiting on GPIO, threads are enough and we avoid forking a process per motion
+        self._pool = ThreadPoolExecutor(max_workers = 3)
         self.turntable = drv8825.drv8825( pinDir =  38, pinStep = 40, pinEnable = 32, waitingTime=0.0005  )
         self.cantilever = drv8825.drv8825( pinDir = 29, pinStep = 31, pinEnable= 32, waitingTime=0.002 )
         self.anchorpoint = drv8825.drv8825( pinDir = 33, pinStep = 35, pinEnable= 32, waitingTime=0.0002 )
@@ -58,13 +61,10 @@ class arm():
         #    #print( "------>", sp.N(sp.rad(sp.N((now-cutoff)/(future-cutoff)*angle)) ))
         #    rclpy.sleep(0.1)
         #    now = time()
-        setattr( self, angleName, sp.N(sp.rad(angle)))
+        setattr( self, angleName, math.radians(angle) )
 
     def _stepTurntable(self, delta):
-        if delta >= 0 :
-            self.turntable.doStep( delta, 1 )
-        else:
-            self.turntable.doStep( -delta, 0 )
+        self.turntable.doStep( abs(delta), int(delta >= 0) )
 
     #17300 steps over all
     def _setAngleTurntable( self, angle, spawn ):
@@ -72,10 +72,7 @@ class arm():
         steps = 17300/270*angle
         delta = steps-self.stepsTurnTable
         if spawn:
-            f = lambda: self._stepTurntable(delta)
-            p1 = Process(target = f)
-            p1.start()
-            p1.join()
+            self._pool.submit(self._stepTurntable, delta).result()
         else:
             self._stepTurntable(delta)
         self.stepsTurnTable = steps
@@ -92,10 +89,7 @@ class arm():
         return M
 
     def _stepCantilever( self, delta):
-        if delta >= 0 :
-            self.cantilever.doStep( delta, 0 )
-        else:
-            self.cantilever.doStep( -delta, 1 )
+        self.cantilever.doStep( abs(delta), int(delta < 0) )
 
     #5600 steps over all
     def _setAngleCantilever( self, angle, spawn ):
@@ -103,10 +97,7 @@ class arm():
         steps = 5400/270*angle
         delta = steps-self.stepsCantilever
         if spawn:
-            f = lambda: self._stepCantilever(delta)
-            p1 = Process(target = f)
-            p1.start()
-            p1.join()
+            self._pool.submit(self._stepCantilever, delta).result()
         else:
             self._stepCantilever(delta)
         self.stepsCantilever = steps
@@ -123,20 +114,14 @@ class arm():
         return M
 
     def _stepAnchorPoint(self, delta):
-        if delta >= 0 :
-            self.anchorpoint.doStep( delta, 1 )
-        else:
-            self.anchorpoint.doStep( -delta, 0 )
+        self.anchorpoint.doStep( abs(delta), int(delta >= 0) )
 
     def _setAngleAnchorPoint( self, angle, spawn ):
         assert( angle >= -30 and angle <= 270 )
         steps = 5400/270*angle*5
         delta = steps-self.stepsAnchorpoint
         if spawn:
-            f = lambda: self._stepAnchorPoint(delta)
-            p1 = Process(target = f)
-            p1.start()
-            p1.join()
+            self._pool.submit(self._stepAnchorPoint, delta).result()
         else:
             self._stepAnchorPoint(delta)
         self.stepsAnchorpoint = steps
@@ -176,18 +161,12 @@ class arm():
         self.setAngleCantilever( 0 )
 
     def retractArm( self ):
-        f = lambda: self._setAngleCantilever( 0, False )
-        g = lambda: self._setAngleTurntable( 0, False ) 
-        h = lambda: self._setAngleAnchorPoint( 0, False )
-        p1 = Process(target = f)
-        p2 = Process(target = g)
-        p3 = Process(target = h)
-        p1.start()
-        p2.start()
-        p3.start()
-        p1.join()
-        p2.join()
-        p3.join()
+        f = self._pool.submit( self._setAngleCantilever, 0, False )
+        g = self._pool.submit( self._setAngleTurntable, 0, False )
+        h = self._pool.submit( self._setAngleAnchorPoint, 0, False )
+        f.result()
+        g.result()
+        h.result()
         self.stepsAnchorpoint = 0
         self.stepsTurnTable = 0
         self.stepsCantilever = 0
@@ -8,10 +8,10 @@ import steppers
 import RPi.GPIO as GPIO
 from time import sleep, time
 
+import math
+import numpy as np
 import sympy as sp
 
-from multiprocessing import Process
-
 
 
 class carrier():
@@ -40,6 +40,19 @@ class carrier():
         self.x = 0
         self.y = 0
 
+        # steps of each motor as a function of (straight, side, rotate)
+        coeff_straight=1
+        coeff_side=2
+        coeff_rotate=1
+        self._mix = np.array( [ [ coeff_straight,  coeff_side, -coeff_rotate ],
+                                [ coeff_straight, -coeff_side, -coeff_rotate ],
+                                [ coeff_straight, -coeff_side,  coeff_rotate ],
+                                [ coeff_straight,  coeff_side,  coeff_rotate ] ] )
+
+        # last configuration matrix and the (angle, x, y) it was computed for
+        self._cfgMatKey = None
+        self._cfgMat = None
+
 
     # Methods concerning moving the cart
     def __motors_start__( self ):
@@ -51,40 +64,9 @@ class carrier():
     def __compute_steps__( self, straight, side, rotate ):
         """
         """
-        coeff_straight=1
-        coeff_side=2
-        coeff_rotate=1
-    
-        steps_motor1 = coeff_straight * straight + coeff_side * side - coeff_rotate * rotate;
-        steps_motor2 = coeff_straight * straight - coeff_side * side - coeff_rotate * rotate;
-        steps_motor3 = coeff_straight * straight - coeff_side * side + coeff_rotate * rotate;
-        steps_motor4 = coeff_straight * straight + coeff_side * side + coeff_rotate * rotate;
-    
-        steps = []
-        direction = []
-
-        if steps_motor1 > 0: 
-            direction.append( 1 )
-        else:
-            direction.append( 0 )
-
-        if steps_motor2 > 0: 
-            direction.append( 1 )
-        else:
-            direction.append( 0 )
-        
-        if steps_motor3 > 0: 
-            direction.append( 1 )
-        else:
-            direction.append( 0 )
-        
-
-        if steps_motor4 > 0: 
-            direction.append( 1 )
-        else:
-            direction.append( 0 )
-
-        step_list = list( map( abs, [ steps_motor1, steps_motor2, steps_motor3, steps_motor4] ) )
+        steps = self._mix.dot( np.array( [ straight, side, rotate ], dtype=float ) )
+        direction = ( steps > 0 ).astype( int ).tolist()
+        step_list = np.abs( steps ).tolist()
         max_steps = max( step_list )
         stepspertime = 1.6
         self.motors.doSteps( round(max_steps/stepspertime), step_list, direction )
@@ -138,27 +120,29 @@ class carrier():
         #    rclpy.sleep(0.1)
 
         #    now = time()
-        setattr( self, angleName, sp.N(sp.rad(angle)))
+        setattr( self, angleName, math.radians(angle) )
 
-    def __updateDistanceRos__( self, xName, yName, angle, distance, timePerRev ):
+    def _updateDistance( self, angle, distance, timePerRev = 6.4 ):
         #now = time()
         #future = now+distance/157*timePerRev
         #print( "update: now, future", now, future )
         #cutoff = now
         #while now-cutoff < future-cutoff:
         #    print( now-cutoff, future-cutoff, now-cutoff < future-cutoff )
-        #    setattr( self, xName, sp.N( sp.cos( sp.rad(angle))* (now-cutoff)/(future-cutoff)*distance) )
-        #    setattr( self, yName, sp.N( sp.sin( sp.rad(angle))* (now-cutoff)/(future-cutoff)*distance) )
+        #    self.x = sp.N( sp.cos( sp.rad(angle))* (now-cutoff)/(future-cutoff)*distance)
+        #    self.y = sp.N( sp.sin( sp.rad(angle))* (now-cutoff)/(future-cutoff)*distance)
 
-        #    print( "getAttr", getattr( self, xName ) )
-        #    print( "getAttr", getattr( self, yName ) )
+        #    print( "x", self.x )
+        #    print( "y", self.y )
         #    print( "------>", sp.N( sp.cos( sp.rad(angle))* (now-cutoff)/(future-cutoff)*distance) )
         #    print( "------>", sp.N( sp.sin( sp.rad(angle))* (now-cutoff)/(future-cutoff)*distance) )
         #    rclpy.sleep(0.1)
 
         #    now = time()
-        setattr( self, xName, sp.N( sp.cos( sp.rad(angle))*distance) )
-        setattr( self, yName, sp.N( sp.sin( sp.rad(angle))*distance) )
+        c = math.cos( math.radians(angle) )
+        s = math.sin( math.radians(angle) )
+        self.x = c*distance
+        self.y = s*distance
 
 
     # Cart radius = 215mm, wheel radius = 33.5mm -> 6.41 rev. per wheel per full circle
@@ -190,13 +174,13 @@ class carrier():
         #angle = steps/(200*6.42*2.15*self.microstepping)*360
         #(angle/360)*200*6.42*2.15*self.microstepping
         #
-        dx = sp.N( sp.cos(self.angleCart)*distance )
-        dy = sp.N( sp.sin(self.angleCart)*distance )
+        dx = math.cos(self.angleCart)*distance
+        dy = math.sin(self.angleCart)*distance
         
         print( "x, y, dx, dy", self.x, self.y, dx, dy )
         self.x += dx
         self.y += dy
-        #self.__updateDistanceRos__( "x", "y", self.angleCart, distance, 6.4 )
+        #self._updateDistance( self.angleCart, distance, 6.4 )
         
 
         self.__motors_shutdown__()
@@ -206,8 +190,16 @@ class carrier():
 
 
     def getConfigurationMatrixCart( self ):
-        angle = sp.rad( self.angleCart  )
-        M = sp.Matrix( [ [sp.cos( angle ), -sp.sin( angle ), 0, sp.N(self.x)], [sp.sin(angle), sp.cos(angle), 0, sp.N(self.y)], [0, 0, 1, self.offset], [0, 0, 0, 1] ] )         
+        # the tf updater polls this periodically, most of the time the cart has not moved
+        key = ( self.angleCart, self.x, self.y )
+        if key != self._cfgMatKey:
+            # the angle and position are plain numbers, only the result needs to be a sympy matrix (tf_updater)
+            angle = math.radians( self.angleCart )
+            c = math.cos( angle )
+            s = math.sin( angle )
+            self._cfgMat = sp.ImmutableMatrix( [ [c, -s, 0, float(self.x)], [s, c, 0, float(self.y)], [0, 0, 1, self.offset], [0, 0, 0, 1] ] )
+            self._cfgMatKey = key
+        M = self._cfgMat
         print( "caa cart>>", M) 
         return M 
 
@@ -6,6 +6,17 @@ import ctypes
 
 libc = ctypes.CDLL('libc.so.6')
 
+# pigpio is optional, with it the step pulses are generated as DMA waveforms
+try:
+    import pigpio
+except ImportError:
+    pigpio = None
+
+# pigpio uses the BCM numbering, we use the BOARD numbering
+boardToBcm = { 3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22,
+               16: 23, 18: 24, 19: 10, 21: 9, 22: 25, 23: 11, 24: 8, 26: 7, 27: 0,
+               28: 1, 29: 5, 31: 6, 32: 12, 33: 13, 35: 19, 36: 16, 37: 26, 38: 20, 40: 21 }
+
 class Steppers():
     def __init__( self, n, pinDir, pinStep, pinNen, ccw=0, usec=500 ):
         self.position = 0
@@ -31,6 +42,16 @@ class Steppers():
             GPIO.setup( self.pinNen[i], GPIO.OUT)
             i += 1
 
+        # use the pigpio daemon if it is running
+        self.pi = None
+        if pigpio != None:
+            pi = pigpio.pi()
+            if pi.connected:
+                self.pi = pi
+                self.stepMasks = [ 1 << boardToBcm[p] for p in self.pinStep ]
+                for p in self.pinStep:
+                    self.pi.set_mode( boardToBcm[p], pigpio.OUTPUT )
+
     # toggle the not enable pin
     def on( self ):
         i = 0
@@ -68,6 +89,10 @@ class Steppers():
                 GPIO.output( self.pinDir[i], self.PULL )
             i += 1
 
+        if self.pi != None:
+            self.__waveSteps__( iteration, dt )
+            return
+
         while iteration > 0:
             iteration -= 1
 
@@ -97,3 +122,40 @@ class Steppers():
         #while i < self.n:
         #    print(i,":", c[i])
         #    i+=1
+
+    # same pulse schedule as the loop in doSteps but played by pigpio.
+    # the pulse width is taken out of the wait so each iteration lasts usec, like in the loop
+    def __waveSteps__( self, iteration, dt ):
+        pulseWidth = 5 # µs, the drivers need at least 2
+        maxPulses = self.pi.wave_get_max_pulses() - 2
+        pulses = []
+        while iteration > 0:
+            iteration -= 1
+            mask = 0
+            i = 0
+            while i < self.n:
+                if self.delta[i] > 0 :
+                    mask |= self.stepMasks[i]
+                    self.delta[i] -= 2 * self.usec
+                self.delta[i] += 2 * dt[i]
+                i += 1
+            if mask != 0:
+                pulses.append( pigpio.pulse( mask, 0, pulseWidth ) )
+                pulses.append( pigpio.pulse( 0, mask, int(self.usec) - pulseWidth ) )
+            elif len(pulses) > 0:
+                # no step, extend the previous wait
+                last = pulses[-1]
+                pulses[-1] = pigpio.pulse( last.gpio_on, last.gpio_off, last.delay + int(self.usec) )
+            else:
+                pulses.append( pigpio.pulse( 0, 0, int(self.usec) ) )
+            if len(pulses) >= maxPulses or iteration <= 0:
+                self.__sendWave__( pulses )
+                pulses = []
+
+    def __sendWave__( self, pulses ):
+        self.pi.wave_add_generic( pulses )
+        wid = self.pi.wave_create()
+        self.pi.wave_send_once( wid )
+        while self.pi.wave_tx_busy():
+            sleep( 0.001 )
+        self.pi.wave_delete( wid )
@@ -0,0 +1,124 @@
+import sys
+import types
+from collections import namedtuple
+
+import unittest
+
+# no Raspberry Pi here: fake RPi.GPIO and pigpio before loading steppers
+
+gpio = types.ModuleType('RPi.GPIO')
+gpio.BOARD = 'BOARD'
+gpio.OUT = 'OUT'
+gpio.HIGH = 1
+gpio.LOW = 0
+gpio.setmode = lambda mode: None
+gpio.setup = lambda pin, mode: None
+gpio.input = lambda pin: gpio.LOW
+gpio.output = lambda pin, value: None
+rpi = types.ModuleType('RPi')
+rpi.GPIO = gpio
+sys.modules['RPi'] = rpi
+sys.modules['RPi.GPIO'] = gpio
+
+class FakePi():
+    def __init__( self ):
+        self.connected = True
+        self.waves = []
+    def set_mode( self, pin, mode ):
+        pass
+    def wave_get_max_pulses( self ):
+        return 12
+    def wave_add_generic( self, pulses ):
+        self.waves.append( list(pulses) )
+    def wave_create( self ):
+        return len(self.waves)
+    def wave_send_once( self, wid ):
+        pass
+    def wave_tx_busy( self ):
+        return False
+    def wave_delete( self, wid ):
+        pass
+
+pigpio = types.ModuleType('pigpio')
+pigpio.OUTPUT = 1
+pigpio.pulse = namedtuple('pulse', ['gpio_on', 'gpio_off', 'delay'])
+pigpio.pi = FakePi
+sys.modules['pigpio'] = pigpio
+
+import steppers
+
+class FakeLibc():
+    def __init__( self ):
+        self.sleeps = 0
+    def usleep( self, usec ):
+        self.sleeps += 1
+
+class SteppersTests(unittest.TestCase):
+
+    def setUp( self ):
+        self.usec = 500
+        self.stepPins = [12, 15]
+
+    def mkSteppers( self ):
+        return steppers.Steppers( 2, [11, 13], self.stepPins, [3, 3], usec = self.usec )
+
+    def waveSchedule( self, pulses ):
+        time = 0
+        schedule = []
+        for p in pulses:
+            if p.gpio_on != 0:
+                schedule.append( (time, p.gpio_on) )
+            time += p.delay
+        return schedule, time
+
+    def test_wave( self ):
+        s = self.mkSteppers()
+        self.assertTrue(s.pi != None)
+        duration = 20 # ms, 40 iterations
+        numberSteps = [ 7, 3 ]
+        s.doSteps( duration, numberSteps, [ 1, 0 ] )
+        pulses = [ p for w in s.pi.waves for p in w ]
+        self.assertTrue(len(s.pi.waves) > 1)
+        self.assertTrue(all(len(w) <= s.pi.wave_get_max_pulses() for w in s.pi.waves))
+        schedule, total = self.waveSchedule( pulses )
+        # same overall duration as the loop
+        self.assertEqual(total, duration * 1000)
+        # the pulses start on an iteration and are followed by the rest of the iteration
+        self.assertTrue(all(t % self.usec == 0 for t, mask in schedule))
+        for p in pulses:
+            if p.gpio_on != 0:
+                self.assertEqual(p.delay, 5)
+        masks = [ 1 << steppers.boardToBcm[p] for p in self.stepPins ]
+        for mask, n in zip(masks, numberSteps):
+            self.assertEqual(len([ t for t, m in schedule if m & mask ]), n)
+
+    def test_same_as_loop( self ):
+        duration = 20
+        numberSteps = [ 7, 3 ]
+        # the loop: a step is a HIGH on a step pin, the iteration is the number of sleeps before it
+        s = self.mkSteppers()
+        s.pi = None
+        libc = FakeLibc()
+        realLibc = steppers.libc
+        steppers.libc = libc
+        loop = {}
+        def output( pin, value ):
+            if value == gpio.HIGH and pin in self.stepPins:
+                t = libc.sleeps * self.usec
+                loop[t] = loop.get(t, 0) | (1 << steppers.boardToBcm[pin])
+        gpio.output = output
+        try:
+            s.doSteps( duration, numberSteps, [ 1, 0 ] )
+        finally:
+            gpio.output = lambda pin, value: None
+            steppers.libc = realLibc
+        self.assertEqual(libc.sleeps * self.usec, duration * 1000)
+        # the wave
+        s = self.mkSteppers()
+        s.doSteps( duration, numberSteps, [ 1, 0 ] )
+        schedule, total = self.waveSchedule( [ p for w in s.pi.waves for p in w ] )
+        self.assertEqual(schedule, sorted(loop.items()))
+        self.assertEqual(total, duration * 1000)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,9 +4,17 @@ from ast_proj import *
 import interpreter.ast_inter as ast_inter
 from sympy import *
 from utils.DrealInterface import DrealInterface
-from utils.vc import VC
+from utils.vc import VC, BatchedImplier
 from utils.cfa import CFA
 from copy import *
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import spec.conf
+import hashlib
+import json
+import fcntl
+import os
 import logging
 
 log = logging.getLogger("Refinement")
@@ -19,147 +27,478 @@ class Refinement(CFA):
         super().__init__(program)
         self.projection = projection
         self.state_to_node = projection.mk_state_to_node()
+        # keyed by the canonical forms of the two conditions
         self.cachedImplication = {}
+        self.canonicalForms = {}
+        # implications already checked by previous runs, indexed by the hash of the query
+        self.cacheFile = spec.conf.implicationCache
+        self.storedImplication = self._loadCache(self.cacheFile)
+        self.cacheDirty = False
+        # for subsumption: conjunct -> conjunctions known to imply it,
+        # conjunction -> conjunctions known not to imply it
+        self.impliedBy = {}
+        self.notImpliedBy = {}
+        self.implier = BatchedImplier()
+        self.trivialHits = 0
         log.debug("= Proj =\n%s", projection)
-        self.compat = {}
+        # compat is a bitset over the states (one row per label), see check
+        self.compat = None
+        self.labelIndex = {}
+        self.stateBit = {}
+        self.states = []
+        # label -> labels whose compatibility has read it, used to know what to recheck
+        self.dependents = {}
+        self.checking = None
+        # (label, state) -> (compatible, the (label, state) pairs it found in compat)
+        self.compatMemo = {}
+        self.reads = None
+        # (condition, choice node) -> for each guard, whether the condition implies it. It does not change across rounds
+        self.guardImplies = {}
+        # the AST nodes are all direct subclasses of ast_inter.Node so the exact type is enough
+        self.handlers = {
+            ast_inter.Motion: self._compatMotion,
+            ast_inter.Assign: self._compatAssign,
+            ast_inter.While: self._compatWhile,
+            ast_inter.If: self._compatIf,
+            ast_inter.IfComponent: self._compatIfComponent,
+            ast_inter.Send: self._compatSend,
+            ast_inter.Receive: self._compatReceive,
+            ast_inter.Action: self._compatAction,
+            ast_inter.Print: self._compatSkip,
+            ast_inter.Skip: self._compatSkip,
+            ast_inter.Statement: self._compatSkip,
+            ast_inter.Exit: self._compatExit
+        }
+        self.endStates = { l for l, n in self.state_to_node.items() if isinstance(n, End) }
+        # labels of the sub-statements, they do not change once the program is labelled
+        self.bodyLabel = {}
+        self.motionLabel = {}
+        self.actionLabels = {}
+        self.caseLabels = {}
+        for l, st in self.programLabels.items():
+            if isinstance(st, (ast_inter.While, ast_inter.IfComponent, ast_inter.Action)):
+                self.bodyLabel[l] = st.program.get_label()
+            elif isinstance(st, ast_inter.Receive):
+                self.motionLabel[l] = st.motion.get_label()
+                self.actionLabels[l] = [ a.get_label() for a in st.actions ]
+            elif isinstance(st, ast_inter.If):
+                self.caseLabels[l] = [ (case.condition, case.program.get_label()) for case in st.if_list ]
+        # the names used in the program and the projection are known upfront, compare them once
+        progMps = { st.value for st in self.programLabels.values() if isinstance(st, ast_inter.Motion) }
+        projMps = { n.motions[0].mp_name for n in self.state_to_node.values() if isinstance(n, Motion) }
+        self.mpNames = { (n1, n2): self._sameName(n1, n2, 'm_') for n1 in progMps for n2 in projMps }
+        progMsgs = { st.msg_type for st in self.programLabels.values() if isinstance(st, ast_inter.Send) }
+        projMsgs = { n.msg_type for n in self.state_to_node.values() if isinstance(n, SendMessage) }
+        self.msgNames = { (n1, n2): self._sameName(n1, n2, 'msg_') for n1 in progMsgs for n2 in projMsgs }
 
-    def implies(self, cond1, cond2):
-        if (cond1,cond2) in self.cachedImplication:
-            return self.cachedImplication[(cond1,cond2)]
+    def _canonical(self, e):
+        '''srepr of e with the arguments of commutative operators sorted, so it does not depend on how e was built'''
+        if not e in self.canonicalForms:
+            if len(e.args) == 0:
+                c = srepr(e)
+            else:
+                args = [ self._canonical(a) for a in e.args ]
+                if isinstance(e, (And, Or, Add, Mul)):
+                    args.sort()
+                c = e.func.__name__ + "(" + ", ".join(args) + ")"
+            self.canonicalForms[e] = c
+        return self.canonicalForms[e]
+
+    def _cacheKey(self, cond1, cond2):
+        return (self._canonical(cond1), self._canonical(cond2))
+
+    def _implicationKey(self, ckey):
+        # the answer of dReal depends on its settings, keep the results of different settings apart
+        settings = str(spec.conf.dRealPrecision) + "|" + str(self.implier.timeout)
+        return hashlib.sha256((ckey[0] + "|" + ckey[1] + "|" + settings).encode()).hexdigest()
+
+    def _loadCache(self, path):
+        if path == None or not os.path.exists(path):
+            return {}
+        with open(path, 'r') as f:
+            fcntl.flock(f, fcntl.LOCK_SH)
+            try:
+                return json.load(f)
+            except ValueError:
+                log.warning("ignoring malformed implication cache %s", path)
+                return {}
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _saveCache(self, path):
+        if path == None or not self.cacheDirty:
+            return
+        with open(path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # other runs may have added entries since we loaded the file
+                f.seek(0)
+                try:
+                    stored = json.load(f)
+                except ValueError:
+                    stored = {}
+                stored.update(self.storedImplication)
+                f.seek(0)
+                f.truncate()
+                json.dump(stored, f)
+                f.flush()
+                self.storedImplication = stored
+                self.cacheDirty = False
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _subsumed(self, cond1, cond2):
+        '''tries to answer cond1 => cond2 from the implications already checked, returns None if it cannot'''
+        c1 = frozenset(And.make_args(cond1))
+        c2 = frozenset(And.make_args(cond2))
+        # a stronger premise implies every conjunct implied by a weaker one
+        if all(any(a.issubset(c1) for a in self.impliedBy.get(c, ())) for c in c2):
+            return True
+        # a weaker premise cannot imply what a stronger one does not imply
+        if any(c1.issubset(a) for a in self.notImpliedBy.get(c2, ())):
+            return False
+        for c in c2:
+            if any(c1.issubset(a) for a in self.notImpliedBy.get(frozenset([c]), ())):
+                return False
+        return None
+
+    def _recordImplication(self, cond1, cond2, res):
+        c1 = frozenset(And.make_args(cond1))
+        if res:
+            for c in And.make_args(cond2):
+                self.impliedBy.setdefault(c, set()).add(c1)
         else:
-            f = simplify(And(cond1, Not(cond2)))
-            vc = VC("implication", [f])
-            res = vc.discharge()
-            log.debug("%s => %s: %s", cond1, cond2, res)
-            self.cachedImplication[(cond1,cond2)] = res
+            self.notImpliedBy.setdefault(frozenset(And.make_args(cond2)), set()).add(c1)
+
+    def _knownImplication(self, cond1, cond2, key):
+        if cond2 in And.make_args(cond1):
+            self.trivialHits += 1
+            return True
+        elif key in self.storedImplication:
+            return self.storedImplication[key]
+        else:
+            return self._subsumed(cond1, cond2)
+
+    def _addImplication(self, cond1, cond2, ckey, key, res, fresh):
+        '''records the result of cond1 => cond2 and returns it. None is a timeout: it counts as False for this run only'''
+        if res == None:
+            log.debug("%s => %s: unknown", cond1, cond2)
+            self.cachedImplication[ckey] = False
+            return False
+        if fresh:
+            self.storedImplication[key] = res
+            self.cacheDirty = True
+        self._recordImplication(cond1, cond2, res)
+        log.debug("%s => %s: %s", cond1, cond2, res)
+        self.cachedImplication[ckey] = res
+        return res
+
+    def _trivialImplication(self, cond1, cond2):
+        '''cheap syntactic cases of cond1 => cond2, returns None when it does not know'''
+        if cond2 == S.true or cond1 == S.false or cond1 == cond2:
+            return True
+        return None
+
+    def implies(self, cond1, cond2):
+        res = self._trivialImplication(cond1, cond2)
+        if res != None:
+            # counted here only, impliesAll skips these and leaves them to implies
+            self.trivialHits += 1
             return res
+        ckey = self._cacheKey(cond1, cond2)
+        if ckey in self.cachedImplication:
+            return self.cachedImplication[ckey]
+        key = self._implicationKey(ckey)
+        res = self._knownImplication(cond1, cond2, key)
+        fresh = res == None
+        if fresh:
+            # no simplify, it is much slower than what the solver needs to deal with the formula as is
+            f = And(cond1, Not(cond2))
+            vc = VC("implication", [f])
+            res = vc.discharge(self.implier.timeout)
+            if vc.unknown:
+                res = None
+        return self._addImplication(cond1, cond2, ckey, key, res, fresh)
+
+    def _pendingImplications(self, cond, conclusions):
+        '''the (conclusion, cache key, store key) for which cond => conclusion is not known yet'''
+        pending = {}
+        for c in conclusions:
+            if self._trivialImplication(cond, c) != None:
+                continue
+            ckey = self._cacheKey(cond, c)
+            if not ckey in self.cachedImplication and not ckey in pending:
+                key = self._implicationKey(ckey)
+                res = self._knownImplication(cond, c, key)
+                if res == None:
+                    pending[ckey] = (c, ckey, key)
+                else:
+                    self._addImplication(cond, c, ckey, key, res, False)
+        return list(pending.values())
+
+    def impliesAll(self, cond, conclusions):
+        '''fills the cache for cond => c for all the conclusions, the unknown ones are checked in a single batch'''
+        pending = self._pendingImplications(cond, conclusions)
+        if len(pending) > 0:
+            results = self.implier.checkMany(cond, [ c for c, ckey, key in pending ])
+            for (c, ckey, key), res in zip(pending, results):
+                self._addImplication(cond, c, ckey, key, res, True)
+
+    def _prefetchImplications(self, jobs):
+        '''checks upfront the implications between the conditions of the program and the guards of the projection.
+           Every label starts compatible with every state, so the first round of check asks for each loop condition,
+           first case of an if, and component condition against the guards of every choice node. Only these are prefetched,
+           the ones asked depending on other answers (the exit of a loop, the later cases of an if) are left to the lazy path.
+           The batches run in parallel (each one is a dReal process), the caches are only updated from this thread.'''
+        guards = [ gs.expression for n in self.state_to_node.values() if isinstance(n, GuardedChoice) for gs in n.guarded_states ]
+        conds = []
+        for st in self.programLabels.values():
+            if isinstance(st, ast_inter.While) and st.condition != S.true:
+                conds.append(st.condition)
+            elif isinstance(st, ast_inter.If):
+                conds.append(st.if_list[0].condition)
+            elif isinstance(st, ast_inter.IfComponent):
+                conds.append(st.condition)
+        batches = {}
+        for cond in conds:
+            ckey = self._canonical(cond)
+            if not ckey in batches:
+                pending = self._pendingImplications(cond, guards)
+                if len(pending) > 0:
+                    batches[ckey] = (cond, pending)
+        if len(batches) == 0:
+            return
+        with ThreadPoolExecutor(max_workers = jobs) as executor:
+            futures = [ (cond, pending, executor.submit(self.implier.checkMany, cond, [ c for c, ckey, key in pending ])) for cond, pending in batches.values() ]
+            for cond, pending, future in futures:
+                for (c, ckey, key), res in zip(pending, future.result()):
+                    self._addImplication(cond, c, ckey, key, res, True)
+
+    def _inCompat(self, label, state):
+        b = self.stateBit.get(state)
+        if b == None:
+            return False
+        return bool(self.compat[self.labelIndex[label], b[0]] & b[1])
+
+    def _discard(self, label, state):
+        '''removes state from the compatible states of label, returns whether it was there'''
+        w, mask = self.stateBit[state]
+        l = self.labelIndex[label]
+        before = self.compat[l, w]
+        self.compat[l, w] = before & ~mask
+        return self.compat[l, w] != before
+
+    def compatStates(self, label):
+        '''the states currently compatible with label'''
+        states = []
+        # the words are copied as python ints, removing states while going over the result is fine
+        for w, word in enumerate(self.compat[self.labelIndex[label]].tolist()):
+            base = w << 6
+            while word != 0:
+                low = word & -word
+                states.append(self.states[base + low.bit_length() - 1])
+                word ^= low
+        return states
 
     def _refines(self, statment, node):
         if statment == None:
-            return isinstance(self.state_to_node[node], End)
+            return node in self.endStates
         else:
-            return node in self.compat[statment]
+            if self.checking != None:
+                self.dependents.setdefault(statment, set()).add(self.checking)
+            res = self._inCompat(statment, node)
+            if res and self.reads != None:
+                self.reads.append( (statment, node) )
+            return res
 
-    def sameMpName(self, n1, n2):
+    def _sameName(self, n1, n2, prefix):
         l1 = n1.lower()
         l2 = n2.lower()
-        return l1 == l2 or l1 == ('m_' + l2)
+        return l1 == l2 or l1 == (prefix + l2)
+
+    def sameMpName(self, n1, n2):
+        key = (n1, n2)
+        if not key in self.mpNames:
+            self.mpNames[key] = self._sameName(n1, n2, 'm_')
+        return self.mpNames[key]
     
     def sameMsgName(self, n1, n2):
-        l1 = n1.lower()
-        l2 = n2.lower()
-        return l1 == l2 or l1 == ('msg_' + l2)
+        key = (n1, n2)
+        if not key in self.msgNames:
+            self.msgNames[key] = self._sameName(n1, n2, 'msg_')
+        return self.msgNames[key]
 
     def compatible(self, statmentL, nodeL):
         statment = self.programLabels[statmentL]
         node = self.state_to_node[nodeL]
-        if isinstance(statment, ast_inter.Motion):
-            if isinstance(node, Motion):
-                #TODO check the args
-                #print("1")
-                res = self.sameMpName(statment.value, node.motions[0].mp_name) and self._refines(self.nextStatement(statmentL), node.end_state[0])
-                log.debug("%s %s %s\t%s\t%s", "compatible" if res else "not compatible", statmentL, nodeL, '\t', statment.value, '\t', node.motions[0].mp_name)
-                return res
+        handler = self.handlers.get(type(statment))
+        if handler == None:
+            raise Exception("unexpected " + str(type(statment)) + ": " + str(statment))
+        return handler(statmentL, statment, nodeL, node)
+
+    def _compatMotion(self, statmentL, statment, nodeL, node):
+        if isinstance(node, Motion):
+            #TODO check the args
+            #print("1")
+            res = self.sameMpName(statment.value, node.motions[0].mp_name) and self._refines(self.nextStatement(statmentL), node.end_state[0])
+            log.debug("%s %s %s\t%s\t%s", "compatible" if res else "not compatible", statmentL, nodeL, '\t', statment.value, '\t', node.motions[0].mp_name)
+            return res
+        else:
+            return False
+
+    def _compatAssign(self, statmentL, statment, nodeL, node):
+        #print("2")
+        #TODO keep and enviromenent ...
+        return self._refines(self.nextStatement(statmentL), nodeL)
+
+    def _guardTable(self, cond, nodeL, node):
+        key = (cond, nodeL)
+        table = self.guardImplies.get(key)
+        if table == None:
+            guards = [ gs.expression for gs in node.guarded_states ]
+            self.impliesAll(cond, guards)
+            table = [ self.implies(cond, g) for g in guards ]
+            self.guardImplies[key] = table
+        return table
+
+    def _compatWhile(self, statmentL, statment, nodeL, node):
+        if statment.condition == S.true:
+            #print("3")
+            return self._refines(self.bodyLabel[statmentL], nodeL)
+        elif isinstance(node, GuardedChoice):
+            table = self._guardTable(statment.condition, nodeL, node)
+            if any( imp and self._refines(self.bodyLabel[statmentL], gs.id) for imp, gs in zip(table, node.guarded_states)):
+                pass
             else:
+                #print("4")
                 return False
-        elif isinstance(statment, ast_inter.Assign):
-            #print("2")
-            #TODO keep and enviromenent ...
-            return self._refines(self.nextStatement(statmentL), nodeL)
-        elif isinstance(statment, ast_inter.While):
-            if statment.condition == S.true:
-                #print("3")
-                return self._refines(statment.program.get_label(), nodeL)
-            elif isinstance(node, GuardedChoice):
-                if any( self.implies(statment.condition, gs.expression) and self._refines(statment.program.get_label(), gs.id) for gs in node.guarded_states):
-                    pass
-                else:
-                    #print("4")
-                    return False
-                if any( self.implies(Not(statment.condition), gs.expression) and self._refines(self.nextStatement(statmentL), gs.id) for gs in node.guarded_states):
+            table = self._guardTable(Not(statment.condition), nodeL, node)
+            if any( imp and self._refines(self.nextStatement(statmentL), gs.id) for imp, gs in zip(table, node.guarded_states)):
+                pass
+            else:
+                #print("5")
+                return False
+            #print("6")
+            return True
+        else:
+            #print("7")
+            return False
+
+    def _compatIf(self, statmentL, statment, nodeL, node):
+        if isinstance(node, GuardedChoice):
+            for cond, caseL in self.caseLabels[statmentL]:
+                table = self._guardTable(cond, nodeL, node)
+                if any( imp and self._refines(caseL, gs.id) for imp, gs in zip(table, node.guarded_states)):
                     pass
                 else:
-                    #print("5")
+                    #print("8")
                     return False
-                #print("6")
-                return True
-            else:
-                #print("7")
-                return False
-        elif isinstance(statment, ast_inter.If):
-            if isinstance(node, GuardedChoice):
-                for ifComp in statment.if_list:
-                    if any( self.implies(ifComp.condition, gs.expression) and self._refines(ifComp.program.get_label(), gs.id) for gs in node.guarded_states):
-                        pass
-                    else:
-                        #print("8")
-                        return False
-                #print("9")
-                return True
-            else:
-                trivial = [ case.program for case in statment.if_list if case.condition == S.true ]
-                #print("10")
-                return any(self._refines(s.get_label(), nodeL) for s in trivial)
-        elif isinstance(statment, ast_inter.IfComponent):
-            if isinstance(node, GuardedChoice):
-                return any( self.implies(statment.condition, gs.expression) and self._refines(statment.program.get_label(), gs.id) for gs in node.guarded_states)
-            else:
-                return False
-        elif isinstance(statment, ast_inter.Send):
-            #TODO check the args
-            #print("11")
-            return isinstance(node, SendMessage) and statment.comp == node.receiver and self.sameMsgName(statment.msg_type, node.msg_type) and self._refines(self.nextStatement(statmentL), node.end_state[0])
-        elif isinstance(statment, ast_inter.Receive):
-            if isinstance(node, ReceiveMessage):
-                #TODO check sender
-                #print("12")
-                return any(self._refines(rs.get_label(), nodeL) for rs in statment.actions)
-            if isinstance(node, Motion):
-                #print("13")
-                return self._refines(statment.motion.get_label(), nodeL)
-            elif isinstance(node, ExternalChoice):
-                #TODO check sender
-                #print("14")
-                def findOne(ns):
-                    return self._refines(statment.motion.get_label(), ns) or any(self._refines(r.get_label(), ns) for r in statment.actions)
-                return all( findOne(ns) for ns in node.end_state )
-            else:
-                #print("15")
-                return False
-        elif isinstance(statment, ast_inter.Action):
-            #TODO check the args
-            #print("16")
-            return isinstance(node, ReceiveMessage) and statment.str_msg_type == node.msg_type and self._refines(self.nextStatement(statmentL), node.end_state[0])
-        elif isinstance(statment, ast_inter.Print) or isinstance(statment, ast_inter.Skip) or isinstance(statment, ast_inter.Statement):
-            #print("17")
-            return self._refines(self.nextStatement(statmentL), nodeL)
-        elif isinstance(statment, ast_inter.Exit):
-            #print("19")
-            return isinstance(node, End)
+            #print("9")
+            return True
         else:
-            raise Exception("unexpected " + str(type(statment)) + ": " + str(statment))
+            #print("10")
+            return any(self._refines(caseL, nodeL) for cond, caseL in self.caseLabels[statmentL] if cond == S.true)
+
+    def _compatIfComponent(self, statmentL, statment, nodeL, node):
+        if isinstance(node, GuardedChoice):
+            table = self._guardTable(statment.condition, nodeL, node)
+            return any( imp and self._refines(self.bodyLabel[statmentL], gs.id) for imp, gs in zip(table, node.guarded_states))
+        else:
+            return False
+
+    def _compatSend(self, statmentL, statment, nodeL, node):
+        #TODO check the args
+        #print("11")
+        return isinstance(node, SendMessage) and statment.comp == node.receiver and self.sameMsgName(statment.msg_type, node.msg_type) and self._refines(self.nextStatement(statmentL), node.end_state[0])
+
+    def _compatReceive(self, statmentL, statment, nodeL, node):
+        if isinstance(node, ReceiveMessage):
+            #TODO check sender
+            #print("12")
+            return any(self._refines(rs, nodeL) for rs in self.actionLabels[statmentL])
+        if isinstance(node, Motion):
+            #print("13")
+            return self._refines(self.motionLabel[statmentL], nodeL)
+        elif isinstance(node, ExternalChoice):
+            #TODO check sender
+            #print("14")
+            motionL = self.motionLabel[statmentL]
+            actionsL = self.actionLabels[statmentL]
+            def findOne(ns):
+                return self._refines(motionL, ns) or any(self._refines(r, ns) for r in actionsL)
+            return all( findOne(ns) for ns in node.end_state )
+        else:
+            #print("15")
+            return False
+
+    def _compatAction(self, statmentL, statment, nodeL, node):
+        #TODO check the args
+        #print("16")
+        return isinstance(node, ReceiveMessage) and statment.str_msg_type == node.msg_type and self._refines(self.nextStatement(statmentL), node.end_state[0])
+
+    def _compatSkip(self, statmentL, statment, nodeL, node):
+        #print("17")
+        return self._refines(self.nextStatement(statmentL), nodeL)
+
+    def _compatExit(self, statmentL, statment, nodeL, node):
+        #print("19")
+        return isinstance(node, End)
+
+    def memoCompatible(self, statmentL, nodeL):
+        '''compatible, reusing the last result as long as the pairs it found in compat are still there'''
+        # compat only shrinks, so pairs found missing stay missing and need not be tracked
+        key = (statmentL, nodeL)
+        if key in self.compatMemo:
+            res, reads = self.compatMemo[key]
+            if all(self._inCompat(l, s) for l, s in reads):
+                return res
+        self.reads = []
+        res = self.compatible(statmentL, nodeL)
+        self.compatMemo[key] = (res, self.reads)
+        self.reads = None
+        return res
 
     def check(self):
-        allLabels = set(self.programLabels.keys())
-        allState = set(self.state_to_node.keys())
-        self.compat = { l: copy(allState) for l in allLabels }
-        # main algorithm
-        changed = True
-        while changed:
-            if log.isEnabledFor(logging.DEBUG):
-                log.debug("= Current Refinement =")
-                for l in allLabels:
-                    if len(self.compat[l]) > 0:
-                        log.debug("%s -> %s", l, self.compat[l])
+        allLabels = list(self.programLabels.keys())
+        self.states = list(self.state_to_node.keys())
+        self.labelIndex = { l: i for i, l in enumerate(allLabels) }
+        # word and mask of each state in the bitsets
+        self.stateBit = { s: (i >> 6, np.uint64(1 << (i & 63))) for i, s in enumerate(self.states) }
+        # initially every label is compatible with every state
+        nWords = (len(self.states) + 63) // 64
+        full = np.zeros(nWords, dtype=np.uint64)
+        for i in range(len(self.states)):
+            full[i >> 6] |= np.uint64(1 << (i & 63))
+        self.compat = np.tile(full, (len(allLabels), 1))
+        if spec.conf.refinementJobs > 1:
+            self._prefetchImplications(spec.conf.refinementJobs)
+        # main algorithm: a label needs to be rechecked only when a label it depends on lost some state.
+        # labels depend mostly on the ones after them, so start from the end of the program
+        self.dependents = {}
+        self.compatMemo = {}
+        worklist = deque(reversed(allLabels))
+        queued = set(allLabels)
+        while len(worklist) > 0:
+            l = worklist.popleft()
+            queued.discard(l)
+            self.checking = l
             changed = False
-            for l in allLabels:
-                for s in copy(self.compat[l]):
-                    if not self.compatible(l, s):
-                        changed = True
-                        self.compat[l].discard(s)
+            for s in self.compatStates(l):
+                if not self.memoCompatible(l, s):
+                    changed = self._discard(l, s) or changed
+            self.checking = None
+            if changed:
+                log.debug("%s -> %s", l, self.compatStates(l))
+                for d in self.dependents.get(l, []):
+                    if not d in queued:
+                        queued.add(d)
+                        worklist.append(d)
         if log.isEnabledFor(logging.DEBUG):
             log.debug("= Final Refinement =")
             for l in allLabels:
-                if len(self.compat[l]) > 0:
-                    log.debug("%s -> %s", l, self.compat[l])
-        return self.projection.start_state in self.compat[self.program.get_label()]
+                states = self.compatStates(l)
+                if len(states) > 0:
+                    log.debug("%s -> %s", l, states)
+        self._saveCache(self.cacheFile)
+        log.debug("trivial implications: %s", self.trivialHits)
+        return self._inCompat(self.program.get_label(), self.projection.start_state)
@@ -29,6 +29,12 @@ dRealJobs = 6
 dRealTimeout = 3600
 dRealPrecision = 0.01
 
+# number of implication batches the refinement sends to dReal in parallel (1 to check them lazily)
+refinementJobs = 1
+
+# file where the refinement keeps the results of the implication checks across runs (None to disable)
+implicationCache = None
+
 ## https://stackoverflow.com/questions/51412465/python-best-way-to-setup-global-logger-and-set-the-logging-level-from-command-li
 import logging
 import sys
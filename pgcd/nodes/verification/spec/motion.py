@@ -11,10 +11,11 @@ class MotionPrimitiveFactory(ABC):
 
     def __init__(self, component):
         self._component = component
+        self._name = self.__class__.__name__
         component.addMotionPrimitive(self)
 
     def name(self):
-        return self.__class__.__name__
+        return self._name
 
     def parameters(self):
         return []
@@ -29,6 +30,8 @@ class MotionPrimitive(AssumeGuaranteeContract):
     def __init__(self, name, component):
         super().__init__(name)
         self._component = component
+        # timify is a pure substitution, remember the results
+        self._timified = {}
 
     def name(self):
         return self._name
@@ -37,8 +40,10 @@ class MotionPrimitive(AssumeGuaranteeContract):
         return {self._component}
 
     def timify(self, pred):
-        time = { var: timifyVar(var) for var in self._component.variables() }
-        return pred.subs(time)
+        if not pred in self._timified:
+            time = { var: timifyVar(var) for var in self._component.variables() }
+            self._timified[pred] = pred.subs(time)
+        return self._timified[pred]
 
     def modifies(self):
         '''some motion primitive (like idle) does not change all the variables'''
@@ -6,6 +6,9 @@ from spec.motion import *
 from spec.time import *
 from utils.geometry import *
 import utils.transition
+from utils.numeric import compilePredicate, cubeHolds, cylinderHolds, semiRegularHexagonHolds
+import numpy as np
+import math
 
 #when modeled as triangle then center 2 side is about 0.16
 
@@ -51,6 +54,15 @@ class Cart(Process):
         assert(index == 0)
         return self._mount
 
+    def numericMount(self, x, y, theta):
+        '''the 4x4 homogeneous transform of the mount w.r.t. the frame the cart is on, for concrete x, y, theta'''
+        c = math.cos(theta)
+        s = math.sin(theta)
+        return np.array([[c,  -s,  0.0, x],
+                         [s,   c,  0.0, y],
+                         [0.0, 0.0, 1.0, self.bedHeight],
+                         [0.0, 0.0, 0.0, 1.0]])
+
     def ownResources(self, point, deltaXY = 0.0, deltaXYZ = 0.0):
         return semiRegularHexagon(self.position(),
                                   self.minRadius+deltaXY+deltaXYZ,
@@ -61,6 +73,18 @@ class Cart(Process):
     def abstractResources(self, point, deltaXY = 0.001, deltaXYZ = 0.001):
         return cylinder(self.position(), self.radius + deltaXY + deltaXYZ, self.height + deltaXYZ, point)
 
+    # ownResources and abstractResources for a concrete position of the cart and a point given in frame()
+
+    def ownResourcesHolds(self, x, y, theta, px, py, pz, deltaXY = 0.0, deltaXYZ = 0.0):
+        return semiRegularHexagonHolds(x, y, 0.0, theta,
+                                       self.minRadius+deltaXY+deltaXYZ,
+                                       self.maxRadius+deltaXY+deltaXYZ,
+                                       self.height+deltaXYZ,
+                                       px, py, pz)
+
+    def abstractResourcesHolds(self, x, y, theta, px, py, pz, deltaXY = 0.001, deltaXYZ = 0.001):
+        return cylinderHolds(x, y, 0.0, self.radius + deltaXY + deltaXYZ, self.height + deltaXYZ, px, py, pz)
+
 #the 2nd cart of a cube 0.18 wide, 0.17 long, 0.16 high
 class CartSquare(Cart):
 
@@ -87,6 +111,11 @@ class CartSquare(Cart):
     def abstractResources(self, point, deltaXY = 0.001, deltaXYZ = 0.001):
         return cylinder(self.position(), self.radius + deltaXY + deltaXYZ, self.height + deltaXYZ, point)
 
+    def ownResourcesHolds(self, x, y, theta, px, py, pz, deltaXY = 0.0, deltaXYZ = 0.0):
+        l2 = self.length / 2 + deltaXY + deltaXYZ
+        w2 = self.width / 2 + deltaXY + deltaXYZ
+        return cubeHolds(x, y, 0.0, theta, -l2, -w2, -deltaXYZ, l2, w2, self.height+deltaXYZ, px, py, pz)
+
 
 class CartMotionPrimitive(MotionPrimitive):
     
@@ -95,6 +124,11 @@ class CartMotionPrimitive(MotionPrimitive):
         self.err = 0.005
         self._maxErrorPre = 0.005
         self._maxErrorPost = 0.005
+        # the footprint only depends on the point
+        self._fp_cache = {}
+        # numerical version of preG and postG, compiled on first use
+        self._preFct = None
+        self._postFct = None
         
     def _locAsVec(self, loc):
         return loc.position_wrt(self._frame)
@@ -105,18 +139,36 @@ class CartMotionPrimitive(MotionPrimitive):
     def _onGround(self, loc):
         return Eq(self._component.frame().k.dot(self._locAsVec(loc)) , 0)
 
+    def _fp(self, point):
+        if not point in self._fp_cache:
+            #self._fp_cache[point] = self._component.abstractResources(point, 0.0, self.err)
+            self._fp_cache[point] = self._component.ownResources(point, 0.0, self.err)
+        return self._fp_cache[point]
+
     def preFP(self, point):
-        #return self._component.abstractResources(point, 0.0, self.err)
-        return self._component.ownResources(point, 0.0, self.err)
+        return self._fp(point)
 
     def postFP(self, point):
-        #return self._component.abstractResources(point, 0.0, self.err)
-        return self._component.ownResources(point, 0.0, self.err)
+        return self._fp(point)
 
     def invFP(self, point):
-        #i = self._component.abstractResources(point, 0.0, self.err)
-        i = self._component.ownResources(point, 0.0, self.err)
-        return self.timify(i)
+        return self.timify(self._fp(point))
+
+    def fpHolds(self, x, y, theta, px, py, pz):
+        '''the footprint (preFP, postFP) for a concrete position of the cart and a concrete point'''
+        return self._component.ownResourcesHolds(x, y, theta, px, py, pz, 0.0, self.err)
+
+    def preHolds(self, x, y, theta):
+        '''checks preG for concrete values of the position'''
+        if self._preFct == None:
+            self._preFct = compilePredicate(self._component.outputVariables(), self.preG())
+        return bool(self._preFct(x, y, theta))
+
+    def postHolds(self, x, y, theta):
+        '''checks postG for concrete values of the position'''
+        if self._postFct == None:
+            self._postFct = compilePredicate(self._component.outputVariables(), self.postG())
+        return bool(self._postFct(x, y, theta))
 
 class MoveFromTo(MotionPrimitiveFactory):
 
@@ -144,12 +196,20 @@ class CartMove(CartMotionPrimitive):
         self._src = src
         self._dst = dst
         self._theta = orientation
+        # src, dst, and the frame do not change, the predicates are built on first use
+        self._srcF = None
+        self._dstF = None
+        self._predCache = {}
 
     def _srcFrame(self):
-        return self._frame.locate_new("src", self._locAsVec(self._src))
+        if self._srcF == None:
+            self._srcF = self._frame.locate_new("src", self._locAsVec(self._src))
+        return self._srcF
 
     def _dstFrame(self):
-        return self._frame.locate_new("dst", self._locAsVec(self._dst))
+        if self._dstF == None:
+            self._dstF = self._frame.locate_new("dst", self._locAsVec(self._dst))
+        return self._dstF
 
     def orientation(self):
         if self._theta != None:
@@ -160,18 +220,32 @@ class CartMove(CartMotionPrimitive):
     def duration(self):
         return DurationSpec(0, 1, False) #TODO upper as function of the distance and speed
 
+    def _cached(self, key, build):
+        if not key in self._predCache:
+            self._predCache[key] = build()
+        return self._predCache[key]
+
     def preG(self):
+        return self._cached('pre', self._preG)
+
+    def _preG(self):
         onGround = And(self._onGround(self._src), self._onGround(self._dst), self._onGround(self._component.position()))
         workSpace = cube(self._frame, self._src, self._dst, self._component.position().origin, self._maxErrorPre, self._maxErrorPre, 0.0)
         return And(onGround, workSpace, self.orientation())
 
     def postG(self):
+        return self._cached('post', self._postG)
+
+    def _postG(self):
         onGround = self._onGround(self._component.position())
         #workSpace = cube(self._frame, self._src, self._dst, self._component.position().origin, self._maxErrorPost, self._maxErrorPost, 0.0)
         workSpace = distance(self._component.position().origin, self._dst) <= 0.0
         return And(onGround, workSpace, self.orientation())
 
     def invG(self):
+        return self._cached('inv', self._invG)
+
+    def _invG(self):
         onGround = self._onGround(self._component.position())
         workSpace = cube(self._frame, self._src, self._dst, self._component.position().origin, self._maxErrorPost, self._maxErrorPost, 0.0)
         return self.timify(And(onGround, workSpace, self.orientation()))
@@ -314,12 +388,18 @@ class CartMoveDirection(CartMotionPrimitive):
             self._dMax = dt
         self._radius = component.radius
         self._height = component.height
+        self._srcF = None
+        self._dstF = None
 
     def _srcFrame(self):
-        return self._frame.locate_new("src", self._frame.i * self.x + self._frame.j * self.y)
+        if self._srcF == None:
+            self._srcF = self._frame.locate_new("src", self._frame.i * self.x + self._frame.j * self.y)
+        return self._srcF
 
     def _dstFrame(self):
-        return self._frame.locate_new("dst", self._frame.i * self.x1 + self._frame.j * self.y1)
+        if self._dstF == None:
+            self._dstF = self._frame.locate_new("dst", self._frame.i * self.x1 + self._frame.j * self.y1)
+        return self._dstF
     
     def modifies(self):
         return [self._component._x, self._component._y]
@@ -0,0 +1,78 @@
+from sympy import *
+from experiments_setups import World
+from cart import *
+import numpy as np
+import random
+
+import unittest
+
+# the numerical versions of the predicates should agree with the symbolic ones
+
+def samples(n, seed = 0):
+    rnd = random.Random(seed)
+    for i in range(n):
+        x, y, theta = rnd.uniform(-1, 1), rnd.uniform(-1, 1), rnd.uniform(-3, 3)
+        px, py, pz = x + rnd.uniform(-0.4, 0.4), y + rnd.uniform(-0.4, 0.4), rnd.uniform(-0.05, 0.25)
+        yield (x, y, theta, px, py, pz)
+
+def point(frame, px, py, pz):
+    return frame.origin.locate_new('p', px * frame.i + py * frame.j + pz * frame.k)
+
+class CartTests(unittest.TestCase):
+
+    def footprints(self, cart):
+        mp = CartIdle('Idle', cart)
+        f = cart.frame()
+        seen = set()
+        for x, y, theta, px, py, pz in samples(60):
+            p = point(f, px, py, pz)
+            values = { cart._x: x, cart._y: y, cart._theta: theta }
+            inside = mp.fpHolds(x, y, theta, px, py, pz)
+            seen.add(inside)
+            self.assertEqual(bool(mp.preFP(p).subs(values)), inside)
+            self.assertEqual(bool(cart.abstractResources(p).subs(values)), cart.abstractResourcesHolds(x, y, theta, px, py, pz))
+        # the samples fall on both sides of the boundary
+        self.assertEqual(seen, {True, False})
+
+    def test_footprint(self):
+        self.footprints(Cart("C", World()))
+
+    def test_footprint_square(self):
+        self.footprints(CartSquare("C", World()))
+
+    def test_mount(self):
+        c = Cart("C", World())
+        f = c.frame()
+        for x, y, theta, px, py, pz in samples(5):
+            values = { c._x: x, c._y: y, c._theta: theta }
+            m = c.numericMount(x, y, theta)
+            origin = [ float(e.subs(values)) for e in c.mountingPoint(0).origin.express_coordinates(f) ]
+            rot = np.array(c.mountingPoint(0).rotation_matrix(f).T.subs(values), dtype = float)
+            self.assertTrue(np.allclose(m[:3,3], origin))
+            self.assertTrue(np.allclose(m[:3,:3], rot))
+            self.assertTrue(np.allclose(m[3], [0, 0, 0, 1]))
+
+    def test_pre_post(self):
+        c = Cart("C", World())
+        f = c.frame()
+        mps = [ CartMove('MoveFromTo', c, point(f, 0, 0, 0), point(f, 2, 0, 0)),
+                CartMove('MoveFromTo', c, point(f, 0, 0, 0), point(f, 2, 1, 0), 0.5),
+                CartMoveDirection('MoveCart', c, 0, 0, 0, 1, 0),
+                CartSwipe('Swipe', c, 0, 0, 0, 0.5, 1.0),
+                CartSetAngle('SetAngle', c, 1.0, 0.0) ]
+        rnd = random.Random(1)
+        positions = [ (0, 0, 0), (2, 0, 0), (2, 1, 0.5), (1, 0, 0), (0.001, 0, 0), (0, 0, 1.0) ]
+        positions += [ (rnd.uniform(-1, 3), rnd.uniform(-1, 2), rnd.uniform(-1, 1)) for i in range(20) ]
+        seen = set()
+        for mp in mps:
+            for x, y, theta in positions:
+                values = { c._x: x, c._y: y, c._theta: theta }
+                pre = mp.preHolds(x, y, theta)
+                post = mp.postHolds(x, y, theta)
+                seen.update([pre, post])
+                self.assertEqual(bool(mp.preG().subs(values)), pre)
+                self.assertEqual(bool(mp.postG().subs(values)), post)
+        self.assertEqual(seen, {True, False})
+
+if __name__ == '__main__':
+    unittest.main()
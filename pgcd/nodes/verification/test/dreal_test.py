@@ -0,0 +1,86 @@
+from subprocess import TimeoutExpired
+import io
+from sympy import *
+import utils.DrealInterface
+from utils.vc import BatchedImplier
+
+import unittest
+
+# no dReal here: the processes are faked, each one gives the next scripted answer
+
+class FakeInput(io.StringIO):
+
+    def close(self):
+        pass
+
+class FakeProc():
+
+    def __init__(self, command, outs, timesOut):
+        self.command = command
+        self.stdin = FakeInput()
+        self.outs = outs
+        self.timesOut = timesOut
+        self.killed = False
+
+    def communicate(self, timeout = None):
+        if self.timesOut and not self.killed:
+            raise TimeoutExpired(self.command, timeout)
+        return (self.outs, "")
+
+    def wait(self):
+        return 0
+
+    def kill(self):
+        self.killed = True
+
+class FakePopen():
+
+    def __init__(self, script):
+        self.script = list(script) # (outs, timesOut)
+        self.procs = []
+
+    def __call__(self, command, **kwargs):
+        outs, timesOut = self.script.pop(0)
+        proc = FakeProc(command, outs, timesOut)
+        self.procs.append(proc)
+        return proc
+
+class DrealBatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.popen = utils.DrealInterface.Popen
+        self.x, self.y = symbols('x y')
+        self.cond = And(self.x > 0, self.y > 0)
+        self.conclusions = [ self.x > -1, self.x > 1, self.x + self.y > 0 ]
+
+    def tearDown(self):
+        utils.DrealInterface.Popen = self.popen
+
+    def fake(self, script):
+        fake = FakePopen(script)
+        utils.DrealInterface.Popen = fake
+        return fake
+
+    def test_batch(self):
+        fake = self.fake([ ("unsat\ndelta-sat with delta = 0.001\nunsat\n", False) ])
+        self.assertEqual(BatchedImplier().checkMany(self.cond, self.conclusions), [True, False, True])
+        self.assertEqual(len(fake.procs), 1)
+        problem = fake.procs[0].stdin.getvalue()
+        self.assertEqual(problem.count("(check-sat)"), 3)
+        self.assertEqual(problem.count("(push 1)"), 3)
+        self.assertEqual(problem.count("(pop 1)"), 3)
+
+    def test_missing_answer(self):
+        self.fake([ ("unsat\nunsat\n", False) ])
+        with self.assertRaises(Exception):
+            BatchedImplier().checkMany(self.cond, self.conclusions)
+
+    def test_timeout(self):
+        # the batch answers the first query before the timeout, the others are checked alone
+        fake = self.fake([ ("unsat\n", True), ("delta-sat with delta = 0.001\n", False), ("", True) ])
+        self.assertEqual(BatchedImplier().checkMany(self.cond, self.conclusions), [True, False, None])
+        self.assertEqual(len(fake.procs), 3)
+        self.assertEqual(fake.procs[1].stdin.getvalue().count("(check-sat)"), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,8 @@ from spec.motion import *
 from spec.time import *
 from utils.geometry import *
 import utils.transition
+from utils.numeric import njit, compilePredicate
+import weakref
 
 # A rough model for a franka emika panda arm
 #
@@ -29,11 +31,34 @@ import utils.transition
 
 
 
+def numMin(x, y):
+    '''python's min when x and y are numbers, sympy's Min otherwise'''
+    try:
+        return min(x, y)
+    except TypeError:
+        return Min(x, y)
+
+def numMax(x, y):
+    '''python's max when x and y are numbers, sympy's Max otherwise'''
+    try:
+        return max(x, y)
+    except TypeError:
+        return Max(x, y)
+
+
 class FrankaEmikaPanda(Process):
 
     def __init__(self, name, parent, index = 0):
         # frame is the center of the base on the ground
         super().__init__(name, parent, index)
+        # footprints are pure function of (point, delta), we compute them once
+        self._fp_cache = {}
+        # invariantG, built on first use
+        self._invariantG = None
+        # numerical version of invariantG, compiled on first use
+        self._invariantFct = None
+        # numerical forward kinematics, compiled on first use
+        self._fkFct = None
         # footrpint parameters
         # the arm is mounted at the center of the base
         self.base_x = 0.60
@@ -95,6 +120,18 @@ class FrankaEmikaPanda(Process):
         self._ef = self._df.orient_new_axis(    name + '_ef', self._e + self.e_ref, self._df.k,    location=-0.0825 * self._df.i)
         self._ff = self._ef.orient_new_axis(    name + '_ff', self._f + self.f_ref, self._ef.j,    location= 0.384 * self._ef.k)
         self._effector = self._ff.locate_new(name + '_effector', 0.088 * self._ff.i)
+        # the basis vectors and the corners of the cubes do not depend on the point, compute them once
+        self._frame_i, self._frame_j, self._frame_k = self._frame.i, self._frame.j, self._frame.k
+        self._effector_i, self._effector_j, self._effector_k = self._effector.i, self._effector.j, self._effector.k
+        self._baseLowerBackLeft   = self._frame.origin.locate_new('franka_base_lbl',-self.base_x * self._frame_i / 2 - self.base_y * self._frame_j / 2 )
+        self._baseUpperFrontRight = self._frame.origin.locate_new('franka_base_ufr', self.base_x * self._frame_i / 2 + self.base_y * self._frame_j / 2 + self.base_z * self._frame_k )
+        self._effectorLowerBackLeft   = self._effector.origin.locate_new('franka_effector_lbl',-self.base_x * self._effector_i / 2 - self.base_y * self._effector_j / 2 - self.base_z / 2 * self._effector_k )
+        self._effectorUpperFrontRight = self._effector.origin.locate_new('franka_effector_ufr', self.base_x * self._effector_i / 2 + self.base_y * self._effector_j / 2 + self.base_z / 2 * self._effector_k )
+        self._bottomWorkspace = self._frame.locate_new('franka_bottom_workspace', -0.4 * self._frame_k)
+        # ownResources is built once per delta for a generic point whose coordinates are then replaced
+        self._ptX, self._ptY, self._ptZ = symbols(name + '_pt_x ' + name + '_pt_y ' + name + '_pt_z')
+        self._genericPoint = self._frame.origin.locate_new(name + '_pt', self._ptX * self._frame_i + self._ptY * self._frame_j + self._ptZ * self._frame_k)
+        self._ownFpTemplate = {}
         # motion primitives
         Idle(self)
         HomePos(self)
@@ -110,34 +147,80 @@ class FrankaEmikaPanda(Process):
 
     # min and max for all the angles
     def invariantG(self):
-        domain_a = And(self._a >= self.minAngleA, self._a <= self.maxAngleA)
-        domain_b = And(self._b >= self.minAngleB, self._b <= self.maxAngleB)
-        domain_c = And(self._c >= self.minAngleC, self._c <= self.maxAngleC)
-        domain_d = And(self._d >= self.minAngleD, self._d <= self.maxAngleD)
-        domain_e = And(self._e >= self.minAngleE, self._e <= self.maxAngleE)
-        domain_f = And(self._f >= self.minAngleF, self._f <= self.maxAngleF)
-        domain_g = And(self._g >= self.minAngleG, self._g <= self.maxAngleG)
-        return And(domain_a, domain_b, domain_c, domain_d, domain_e, domain_f, domain_g)
+        # the bounds are fixed, build the formula only once
+        if self._invariantG == None:
+            domain_a = And(self._a >= self.minAngleA, self._a <= self.maxAngleA)
+            domain_b = And(self._b >= self.minAngleB, self._b <= self.maxAngleB)
+            domain_c = And(self._c >= self.minAngleC, self._c <= self.maxAngleC)
+            domain_d = And(self._d >= self.minAngleD, self._d <= self.maxAngleD)
+            domain_e = And(self._e >= self.minAngleE, self._e <= self.maxAngleE)
+            domain_f = And(self._f >= self.minAngleF, self._f <= self.maxAngleF)
+            domain_g = And(self._g >= self.minAngleG, self._g <= self.maxAngleG)
+            self._invariantG = And(domain_a, domain_b, domain_c, domain_d, domain_e, domain_f, domain_g)
+        return self._invariantG
+
+    def invariantHolds(self, a, b, c, d, e, f, g):
+        '''checks invariantG for concrete values of the angles'''
+        if self._invariantFct == None:
+            self._invariantFct = compilePredicate(self.internalVariables(), self.invariantG())
+        return bool(self._invariantFct(a, b, c, d, e, f, g))
         
+    def effectorTransform(self):
+        '''the 4x4 homogeneous transform from the effector to the base frame, as a function of the angles'''
+        rot = self._effector.rotation_matrix(self._frame).T
+        pos = Matrix(self._effector.origin.express_coordinates(self._frame))
+        trans = rot.row_join(pos).col_join(Matrix([[0, 0, 0, 1]]))
+        # only floats so that the compiled version returns a homogeneous array
+        return trans.applyfunc(lambda e: Float(e) if e.is_Number else e)
+
+    def evaluateFK(self, joints):
+        '''effectorTransform for concrete values of the angles (a numpy array)'''
+        if self._fkFct == None:
+            fct = lambdify(self.internalVariables(), self.effectorTransform(), "numpy", cse=True)
+            if njit != None:
+                fct = njit(fct)
+            self._fkFct = fct
+        return self._fkFct(*joints)
+
     def ownResources(self, point, delta = 0.0):
-        lowerBackLeft1   = self._frame.origin.locate_new('franka_base_lbl',-self.base_x * self._frame.i / 2 - self.base_y * self._frame.j / 2 )
-        upperFrontRight1 = self._frame.origin.locate_new('franka_base_ufr', self.base_x * self._frame.i / 2 + self.base_y * self._frame.j / 2 + self.base_z * self._frame.k )
-        baseFP = cube(self._frame, lowerBackLeft1, upperFrontRight1, point, delta)
+        key = ('own', point, float(delta))
+        if not key in self._fp_cache:
+            self._fp_cache[key] = self._ownResources(point, delta)
+        return self._fp_cache[key]
+
+    def timedOwnResources(self, point, delta = 0.0):
+        '''ownResources with the variables as functions of time, shared by all the motion primitives'''
+        key = ('timed', point, float(delta))
+        if not key in self._fp_cache:
+            self._fp_cache[key] = timifyFormula(self.variables(), self.ownResources(point, delta))
+        return self._fp_cache[key]
+
+    def _ownResources(self, point, delta):
+        if not delta in self._ownFpTemplate:
+            self._ownFpTemplate[delta] = self._ownResourcesAt(self._genericPoint, delta)
+        (px, py, pz) = point.express_coordinates(self._frame)
+        return self._ownFpTemplate[delta].xreplace({self._ptX: px, self._ptY: py, self._ptZ: pz})
+
+    def _ownResourcesAt(self, point, delta):
+        baseFP = cube(self._frame, self._baseLowerBackLeft, self._baseUpperFrontRight, point, delta)
         #
         abFP = cylinder(self._af, self.ab_r, self.ab_h, point, delta)
         cdFP = cylinder(self._cf, self.cd_r, self.cd_h, point, delta)
         efFP = cylinder(self._ef, self.ef_r, self.ef_h, point, delta)
         #
-        lowerBackLeft2   = self._effector.origin.locate_new('franka_effector_lbl',-self.base_x * self._effector.i / 2 - self.base_y * self._effector.j / 2 - self.base_z / 2 * self._effector.k )
-        upperFrontRight2 = self._effector.origin.locate_new('franka_effector_ufr', self.base_x * self._effector.i / 2 + self.base_y * self._effector.j / 2 + self.base_z / 2 * self._effector.k )
-        effectorFP = cube(self._effector, lowerBackLeft2, upperFrontRight2, point, delta)
+        effectorFP = cube(self._effector, self._effectorLowerBackLeft, self._effectorUpperFrontRight, point, delta)
         return Or(baseFP, abFP, cdFP, efFP, effectorFP)
     
     # overapproax of the workspace in https://www.franka.de/Panda_Datasheet_May_2019.pdf
     def abstractResources(self, point, delta = 0.0):
+        key = ('abstract', point, float(delta))
+        if not key in self._fp_cache:
+            self._fp_cache[key] = self._abstractResources(point, delta)
+        return self._fp_cache[key]
+
+    def _abstractResources(self, point, delta):
         # delta makes it bigger
-        bottom = self._frame.locate_new('franka_bottom_workspace', -0.4 * self._frame.k)
-        return cylinder(bottom, 0.9, 1.66, point, delta)
+        return cylinder(self._bottomWorkspace, 0.9, 1.66, point, delta)
     
     def mountingPoint(self, index):
         assert(index == 0)
@@ -160,8 +243,8 @@ class FrankaMotionPrimitive(MotionPrimitive):
 
     def invFP(self, point):
         #i = self._component.abstractResources(point, self.err)
-        i = self._component.ownResources(point, self.err)
-        return self.timify(i)
+        #return self.timify(i)
+        return self._component.timedOwnResources(point, self.err)
 
 
 class HomePos(MotionPrimitiveFactory):
@@ -225,29 +308,27 @@ class FrankaIdle(FrankaMotionPrimitive):
 
 
 # since we don't precisely model the gripper, it is like waiting
-class Grasp(MotionPrimitiveFactory):
+class GripperMotion(MotionPrimitiveFactory):
 
-    def __init__(self, component):
-        super().__init__(component)
+    def _mkWait(self):
+        return FrankaWait(self.name(), self._component)
+
+
+class Grasp(GripperMotion):
 
     def parameters(self):
         return ["grasp width"]
 
     def setParameters(self, args):
         assert(len(args) == 1)
-        return FrankaWait(self.name(), self._component)
-
+        return self._mkWait()
 
 
-# since we don't precisely model the gripper, it is like waiting
-class Open(MotionPrimitiveFactory):
-
-    def __init__(self, component):
-        super().__init__(component)
+class Open(GripperMotion):
 
     def setParameters(self, args):
         assert(len(args) == 0)
-        return FrankaWait(self.name(), self._component)
+        return self._mkWait()
 
 class FrankaWait(FrankaMotionPrimitive):
 
@@ -307,47 +388,84 @@ class FrankaMoveTo(FrankaMotionPrimitive):
         self.f1 = f1
         self.g1 = g1
         self.smooth = smooth
+        # bounds for the non-smooth invG, computed once with python's min/max
+        src = [a0, b0, c0, d0, e0, f0, g0]
+        dst = [a1, b1, c1, d1, e1, f1, g1]
+        self._lo = [ numMin(x, y) for x, y in zip(src, dst) ]
+        self._hi = [ numMax(x, y) for x, y in zip(src, dst) ]
+        # numerical version of preG and postG, compiled on first use
+        self._preFct = None
+        self._postFct = None
+        # the predicates only depend on the parameters and err, cache them per err
+        self._predCache = {}
+        # the default err is what the checks use, build these predicates upfront
+        self.preG()
+        self.invG()
+        self.postG()
     
     def duration(self):
         return DurationSpec(0, 2, False) #TODO upper as function of the angle and speed
 
+    # preG, postG, and the smooth invG have the same shape for every move of an arm,
+    # build them once per arm with placeholders and fill in the parameters with xreplace
+    _templates = weakref.WeakKeyDictionary()
+    _srcSyms = symbols('src_a src_b src_c src_d src_e src_f src_g', cls=Dummy)
+    _dstSyms = symbols('dst_a dst_b dst_c dst_d dst_e dst_f dst_g', cls=Dummy)
+    _lowerSyms = symbols('lower_a lower_b lower_c lower_d lower_e lower_f lower_g', cls=Dummy)
+    _upperSyms = symbols('upper_a upper_b upper_c upper_d upper_e upper_f upper_g', cls=Dummy)
+
+    def _template(self):
+        if not self._component in FrankaMoveTo._templates:
+            FrankaMoveTo._templates[self._component] = self._mkTemplate()
+        return FrankaMoveTo._templates[self._component]
+
+    def _mkTemplate(self):
+        joints = self._component.internalVariables()
+        box = And(*[ c for v, lo, hi in zip(joints, FrankaMoveTo._lowerSyms, FrankaMoveTo._upperSyms) for c in (GreaterThan(v, lo), LessThan(v, hi)) ])
+        t = timeSymbol()
+        dt = self.duration().max
+        moves = [ Eq(v, utils.transition.smoothstep(t, x0, x1, dt)) for v, x0, x1 in zip(joints, FrankaMoveTo._srcSyms, FrankaMoveTo._dstSyms) ]
+        return { 'box': box, 'inv': And(t >= 0, t <= dt, *moves) }
+
+    def _boxValues(self, center, err):
+        # the bounds are computed here rather than in the template so numbers stay as they were
+        values = {}
+        for lo, hi, x in zip(FrankaMoveTo._lowerSyms, FrankaMoveTo._upperSyms, center):
+            values[lo] = sympify(x - err)
+            values[hi] = sympify(x + err)
+        return values
+
+    def _srcValues(self):
+        return [self.a0, self.b0, self.c0, self.d0, self.e0, self.f0, self.g0]
+
+    def _dstValues(self):
+        return [self.a1, self.b1, self.c1, self.d1, self.e1, self.f1, self.g1]
+
     def preG(self):
-        return And(self.a0 - self.err <= self._component._a, self._component._a <= self.a0 + self.err,
-                   self.b0 - self.err <= self._component._b, self._component._b <= self.b0 + self.err,
-                   self.c0 - self.err <= self._component._c, self._component._c <= self.c0 + self.err,
-                   self.d0 - self.err <= self._component._d, self._component._d <= self.d0 + self.err,
-                   self.e0 - self.err <= self._component._e, self._component._e <= self.e0 + self.err,
-                   self.f0 - self.err <= self._component._f, self._component._f <= self.f0 + self.err,
-                   self.g0 - self.err <= self._component._g, self._component._g <= self.g0 + self.err)
+        key = ('pre', self.err)
+        if not key in self._predCache:
+            self._predCache[key] = self._preG(self.err)
+        return self._predCache[key]
+
+    def _preG(self, err):
+        return self._template()['box'].xreplace(self._boxValues(self._srcValues(), err))
 
     def invG(self, err = 0.1):
+        key = ('inv', err)
+        if not key in self._predCache:
+            self._predCache[key] = self._invG(err)
+        return self._predCache[key]
+
+    def _invG(self, err):
         cstr = S.true
         if self.smooth:
-            t = timeSymbol()
-            dt = self.duration().max
-            ta = Eq(self._component._a, utils.transition.smoothstep(t, self.a0, self.a1, dt))
-            tb = Eq(self._component._b, utils.transition.smoothstep(t, self.b0, self.b1, dt))
-            tc = Eq(self._component._c, utils.transition.smoothstep(t, self.c0, self.c1, dt))
-            td = Eq(self._component._d, utils.transition.smoothstep(t, self.d0, self.d1, dt))
-            te = Eq(self._component._e, utils.transition.smoothstep(t, self.e0, self.e1, dt))
-            tf = Eq(self._component._f, utils.transition.smoothstep(t, self.f0, self.f1, dt))
-            tg = Eq(self._component._g, utils.transition.smoothstep(t, self.g0, self.g1, dt))
-            cstr = And(t >= 0, t <= dt, ta, tb, tc, td, te, tf, tg)
+            values = { x: sympify(v) for x, v in zip(FrankaMoveTo._srcSyms, self._srcValues()) }
+            values.update({ x: sympify(v) for x, v in zip(FrankaMoveTo._dstSyms, self._dstValues()) })
+            cstr = self._template()['inv'].xreplace(values)
         else:
-            cstr = And(cstr, Min(self.a0, self.a1) - err <= self._component._a )
-            cstr = And(cstr, self._component._a <= Max(self.a0, self.a1) + err )
-            cstr = And(cstr, Min(self.b0, self.b1) - err <= self._component._b )
-            cstr = And(cstr, self._component._b <= Max(self.b0, self.b1) + err )
-            cstr = And(cstr, Min(self.c0, self.c1) - err <= self._component._c )
-            cstr = And(cstr, self._component._c <= Max(self.c0, self.c1) + err )
-            cstr = And(cstr, Min(self.d0, self.d1) - err <= self._component._d )
-            cstr = And(cstr, self._component._d <= Max(self.d0, self.d1) + err )
-            cstr = And(cstr, Min(self.e0, self.e1) - err <= self._component._e )
-            cstr = And(cstr, self._component._e <= Max(self.e0, self.e1) + err )
-            cstr = And(cstr, Min(self.f0, self.f1) - err <= self._component._f )
-            cstr = And(cstr, self._component._f <= Max(self.f0, self.f1) + err )
-            cstr = And(cstr, Min(self.g0, self.g1) - err <= self._component._g )
-            cstr = And(cstr, self._component._g <= Max(self.g0, self.g1) + err )
+            for v, lo, hi in zip(self._component.internalVariables(), self._lo, self._hi):
+                cstr = And(cstr, lo - err <= v )
+                cstr = And(cstr, v <= hi + err )
             changing = []
             if self.a0 != self.a1:
                 changing.append( (self.a0,self.a1,self._component._a) )
@@ -370,10 +488,22 @@ class FrankaMoveTo(FrankaMotionPrimitive):
         return cstr
 
     def postG(self, err = 0.0):
-        return And(self.a1 - err <= self._component._a, self._component._a <= self.a1 + err,
-                   self.b1 - err <= self._component._b, self._component._b <= self.b1 + err,
-                   self.c1 - err <= self._component._c, self._component._c <= self.c1 + err,
-                   self.d1 - err <= self._component._d, self._component._d <= self.d1 + err,
-                   self.e1 - err <= self._component._e, self._component._e <= self.e1 + err,
-                   self.f1 - err <= self._component._f, self._component._f <= self.f1 + err,
-                   self.g1 - err <= self._component._g, self._component._g <= self.g1 + err)
+        key = ('post', err)
+        if not key in self._predCache:
+            self._predCache[key] = self._postG(err)
+        return self._predCache[key]
+
+    def _postG(self, err):
+        return self._template()['box'].xreplace(self._boxValues(self._dstValues(), err))
+
+    def preHolds(self, a, b, c, d, e, f, g):
+        '''checks preG for concrete values of the angles'''
+        if self._preFct == None:
+            self._preFct = compilePredicate(self._component.internalVariables(), self.preG())
+        return bool(self._preFct(a, b, c, d, e, f, g))
+
+    def postHolds(self, a, b, c, d, e, f, g):
+        '''checks postG for concrete values of the angles'''
+        if self._postFct == None:
+            self._postFct = compilePredicate(self._component.internalVariables(), self.postG())
+        return bool(self._postFct(a, b, c, d, e, f, g))
@@ -0,0 +1,61 @@
+from sympy import *
+from experiments_setups import World
+from franka import FrankaEmikaPanda, FrankaMoveTo
+import numpy as np
+import random
+
+import unittest
+
+# the numerical versions of the predicates should agree with the symbolic ones
+
+def angles(rnd, center = None, spread = 3.0):
+    if center == None:
+        center = [ 0.0 ] * 7
+    return [ c + rnd.uniform(-spread, spread) for c in center ]
+
+class FrankaTests(unittest.TestCase):
+
+    def test_invariant(self):
+        fr = FrankaEmikaPanda("franka", World(), 0)
+        rnd = random.Random(0)
+        seen = set()
+        for i in range(50):
+            q = angles(rnd)
+            holds = fr.invariantHolds(*q)
+            seen.add(holds)
+            self.assertEqual(bool(fr.invariantG().subs(dict(zip(fr.internalVariables(), q)))), holds)
+        self.assertEqual(seen, {True, False})
+
+    def test_forward_kinematics(self):
+        fr = FrankaEmikaPanda("franka", World(), 0)
+        rnd = random.Random(1)
+        trans = fr.effectorTransform()
+        for i in range(5):
+            q = angles(rnd)
+            expected = np.array(trans.subs(dict(zip(fr.internalVariables(), q))), dtype = float)
+            self.assertTrue(np.allclose(fr.evaluateFK(np.array(q)), expected))
+
+    def test_pre_post(self):
+        fr = FrankaEmikaPanda("franka", World(), 0)
+        src = [ 0.1, 0.2, 0.3, -1.0, 0.5, 1.0, 0.0 ]
+        dst = [ 0.5, -0.2, 0.0, -1.5, 0.0, 2.0, 0.5 ]
+        mp = FrankaMoveTo("MoveTo", fr, *(src + dst))
+        rnd = random.Random(2)
+        configurations = [ src, dst ]
+        configurations += [ angles(rnd, src, 0.02) for i in range(10) ]
+        configurations += [ angles(rnd, dst, 0.02) for i in range(10) ]
+        configurations += [ angles(rnd) for i in range(10) ]
+        seen = set()
+        for q in configurations:
+            values = dict(zip(fr.internalVariables(), q))
+            pre = mp.preHolds(*q)
+            post = mp.postHolds(*q)
+            seen.update([pre, post])
+            self.assertEqual(bool(mp.preG().subs(values)), pre)
+            self.assertEqual(bool(mp.postG().subs(values)), post)
+        self.assertEqual(seen, {True, False})
+        self.assertTrue(mp.preHolds(*src))
+        self.assertTrue(mp.postHolds(*dst))
+
+if __name__ == '__main__':
+    unittest.main()
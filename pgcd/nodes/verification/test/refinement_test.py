@@ -7,6 +7,9 @@ from experiments_setups import *
 from parser_test import cartAndArmFetch, binSorting, armsHandover, ferry
 from vectorize import *
 from copy import deepcopy
+from xp_fetch_01_test import choreo_old
+import fetch_setup
+import spec.conf
 
 def prog1C():
     return '''
@@ -98,6 +101,180 @@ def run(ch, components, progs, shouldSucceed = True, debug = False):
         if shouldSucceed:
             raise e
 
+def fetchRefinement(name, cls = Refinement):
+    w = cartAndArmWorld()
+    visitor = Projection()
+    visitor.execute(choreo_old(), Env(w, []))
+    chor = visitor.choreography
+    vectorize(chor, w)
+    process = [ p for p in w.allProcesses() if p.name() == name ][0]
+    proj = visitor.project(name, process)
+    progs = { "A": fetch_setup.progFetchA(), "C": fetch_setup.progFetchC() }
+    return cls(parser.Parser().parse(progs[name]), proj)
+
+# answers the implications without dReal: scripted answers, syntactic equality otherwise
+class StubImplier:
+
+    def __init__(self, answers = {}):
+        self.timeout = spec.conf.dRealTimeout
+        self.answers = answers
+        self.queries = []
+
+    def checkMany(self, cond, conclusions):
+        self.queries.extend( (cond, c) for c in conclusions )
+        return [ self.answers.get((cond, c), cond == c) for c in conclusions ]
+
+class ImplicationTests(unittest.TestCase):
+
+    def test_timeout_not_stored(self):
+        a, b = symbols('a b')
+        ref = fetchRefinement("A")
+        ref.implier = StubImplier({ (a, b): None })
+        ref.impliesAll(a, [b])
+        self.assertFalse(ref.implies(a, b))
+        self.assertEqual(ref.storedImplication, {})
+        self.assertFalse(ref.cacheDirty)
+
+    def test_syntactic(self):
+        a, b = symbols('a b')
+        ref = fetchRefinement("A")
+        self.assertTrue(ref.implies(And(a, b), a))
+        self.assertTrue(ref.implies(a, S.true))
+        # both hold when the premise is unsatisfiable, only the solver can tell
+        self.assertEqual(ref._trivialImplication(a, S.false), None)
+        self.assertEqual(ref._trivialImplication(Not(b), b), None)
+
+    def test_trivial_counted_once(self):
+        a, b = symbols('a b')
+        ref = fetchRefinement("A")
+        ref.implier = StubImplier()
+        ref.impliesAll(a, [S.true, a, And(a, b)])
+        self.assertEqual(ref.trivialHits, 0)
+        self.assertTrue(ref.implies(a, S.true))
+        self.assertTrue(ref.implies(a, a))
+        self.assertEqual(ref.trivialHits, 2)
+        self.assertEqual(ref.implier.queries, [(a, And(a, b))])
+
+    def test_key_depends_on_solver_settings(self):
+        ref = fetchRefinement("A")
+        ckey = ref._cacheKey(Symbol('a'), Symbol('b'))
+        key1 = ref._implicationKey(ckey)
+        precision = spec.conf.dRealPrecision
+        try:
+            spec.conf.dRealPrecision = precision / 10
+            self.assertNotEqual(ref._implicationKey(ckey), key1)
+        finally:
+            spec.conf.dRealPrecision = precision
+
+# the compatible states of each label, in the order of the program (the generated labels depend on what was parsed before)
+def compatSets(ref):
+    return [ sorted(map(str, ref.compatStates(l))) for l in ref.programLabels ]
+
+class FixpointTests(unittest.TestCase):
+
+    def test_result_is_bool(self):
+        ref = fetchRefinement("A")
+        ref.implier = StubImplier()
+        self.assertIs(ref.check(), True)
+
+    def test_fetch_arm(self):
+        ref = fetchRefinement("A")
+        ref.implier = StubImplier()
+        self.assertTrue(ref.check())
+        loop = ['done0', 'go1', 'go2', 'prepare0', 'return1', 'return2', 'there0', 'there3']
+        self.assertEqual(compatSets(ref), [
+            loop, loop, loop, loop,
+            ['go2', 'return2'], ['prepare0', 'there3'], ['prepare1', 'there4'], ['prepare1', 'there4'],
+            ['prepare2', 'there5'], ['there0'], ['there1'], ['there1'], ['there2'],
+            ['done0'], ['done1'], ['done1'] ])
+
+    def test_fetch_cart(self):
+        ref = fetchRefinement("C")
+        ref.implier = StubImplier()
+        self.assertTrue(ref.check())
+        self.assertEqual(compatSets(ref), [
+            ['prepare0'], ['prepare0'], ['prepare1', 'prepare2'], ['prepare1'], ['prepare2'],
+            ['go1'], ['go1'], ['go2'], ['go2'], ['there0'],
+            ['there1', 'there2'], ['there1'], ['there2'], ['there3'], ['there3'],
+            ['there4', 'there5'], ['there4'], ['there5'], ['return1'], ['return1'],
+            ['return2'], ['return2'], ['done0'], ['done1'] ])
+
+    def test_fetch_cart_wrong_message(self):
+        proj = fetchRefinement("C").projection
+        prog = fetch_setup.progFetchC().replace("send(A, grab, Pnt(2.2,0,0));", "send(A, fold, 0);")
+        ref = Refinement(parser.Parser().parse(prog), proj)
+        ref.implier = StubImplier()
+        self.assertFalse(ref.check())
+        self.assertEqual(compatSets(ref), [
+            [], [], [], [], [], [], [], [], [], [],
+            ['there1', 'there2'], ['there1'], ['there2'], ['there3'], ['there3'],
+            ['there4', 'there5'], ['there4'], ['there5'], ['return1'], ['return1'],
+            ['return2'], ['return2'], ['done0'], ['done1'] ])
+
+    def test_prefetch(self):
+        lazy = fetchRefinement("C")
+        lazy.implier = StubImplier()
+        self.assertTrue(lazy.check())
+        jobs = spec.conf.refinementJobs
+        try:
+            spec.conf.refinementJobs = 4
+            ref = fetchRefinement("C")
+            ref.implier = StubImplier()
+            self.assertTrue(ref.check())
+        finally:
+            spec.conf.refinementJobs = jobs
+        self.assertEqual(compatSets(ref), compatSets(lazy))
+        # prefetching does not ask more than the lazy path
+        self.assertTrue(len(ref.implier.queries) > 0)
+        self.assertEqual(set(ref.implier.queries), set(lazy.implier.queries))
+        self.assertEqual(len(ref.implier.queries), len(lazy.implier.queries))
+
+class CanonicalTests(unittest.TestCase):
+
+    def test_commutative(self):
+        a, b, x, y = symbols('a b x y')
+        ref = fetchRefinement("A")
+        self.assertEqual(ref._canonical(And(a, b)), ref._canonical(And(b, a)))
+        self.assertEqual(ref._canonical(Or(x + y > 1, a)), ref._canonical(Or(a, y + x > 1)))
+
+    def test_no_collision(self):
+        a, b, x, y = symbols('a b x y')
+        ref = fetchRefinement("A")
+        conds = [ And(a, b), Or(a, b), And(a, Not(b)), x > 1, x >= 1, x > 2, y > 1, x + y > 1, x * y > 1 ]
+        keys = { ref._canonical(c) for c in conds }
+        self.assertEqual(len(keys), len(conds))
+
+class SubsumptionTests(unittest.TestCase):
+
+    def test_implied_by_stronger_premise(self):
+        a, b, c, d, e = symbols('a b c d e')
+        ref = fetchRefinement("A")
+        ref.implier = StubImplier({ (And(a, b), c): True, (And(a, b), d): True })
+        ref.impliesAll(And(a, b), [c, d])
+        self.assertEqual(ref._subsumed(And(a, b, e), And(c, d)), True)
+        # answered without a solver
+        self.assertTrue(ref.implies(And(a, b, e), c))
+
+    def test_not_implied_by_weaker_premise(self):
+        a, b, c, d = symbols('a b c d')
+        ref = fetchRefinement("A")
+        ref.implier = StubImplier({ (And(a, b), c): False })
+        ref.impliesAll(And(a, b), [c])
+        self.assertEqual(ref._subsumed(a, c), False)
+        self.assertEqual(ref._subsumed(a, And(c, d)), False)
+        self.assertFalse(ref.implies(b, c))
+
+    def test_nothing_derived(self):
+        a, b, c, d = symbols('a b c d')
+        ref = fetchRefinement("A")
+        ref.implier = StubImplier({ (And(a, b), c): True, (a, d): False })
+        ref.impliesAll(And(a, b), [c])
+        ref.impliesAll(a, [d])
+        # weaker premise for a positive result, stronger premise for a negative one
+        self.assertEqual(ref._subsumed(a, c), None)
+        self.assertEqual(ref._subsumed(And(a, b), d), None)
+        self.assertEqual(ref._subsumed(And(a, b), And(c, d)), None)
+
 class RefinementTests(unittest.TestCase):
     
     def test_01(self):
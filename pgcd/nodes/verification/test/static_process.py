@@ -19,6 +19,7 @@ class PointProcess(Process):
         self.y = y
         self.z = z
         self.dummyVar = Symbol(name + '_dummy')
+        self._fp_cache = {}
         Idle(self)
         Wait(self)
 
@@ -32,10 +33,19 @@ class PointProcess(Process):
             return sphere(pos, maxError, point)
         else:
             (px,py,pz) = point.express_coordinates(f)
+            coords = (px, py, pz, self.x, self.y, self.z)
+            if all(isinstance(v, (int, float, Number)) for v in coords):
+                # concrete point, no need to build the Eq
+                same = float(px) == float(self.x) and float(py) == float(self.y) and float(pz) == float(self.z)
+                return S.true if same else S.false
             return And(Eq(px, self.x), Eq(py, self.y), Eq(pz, self.z))
 
     def abstractResources(self, point, maxError = 0.0):
-        return self.ownResources(point, maxError)
+        # the footprint does not change, build it only once per (point, maxError)
+        key = (point, float(maxError))
+        if not key in self._fp_cache:
+            self._fp_cache[key] = self.ownResources(point, maxError)
+        return self._fp_cache[key]
 
     def mountingPoint(self, index):
         return ValueException(self.name() + " does not have mounting moints.")
@@ -106,6 +116,27 @@ class FpProcess(Process):
 # Motion primitives #
 #####################
 
+# the footprint of a static process is the same before, during, and after a motion
+class StaticMotionPrimitive(MotionPrimitive):
+
+    def __init__(self, name, component):
+        super().__init__(name, component)
+        self._fp_cache = {}
+
+    def _fp(self, point):
+        if not point in self._fp_cache:
+            self._fp_cache[point] = self._component.abstractResources(point, delta)
+        return self._fp_cache[point]
+
+    def preFP(self, point):
+        return self._fp(point)
+
+    def postFP(self, point):
+        return self._fp(point)
+
+    def invFP(self, point):
+        return self.timify(self._fp(point))
+
 class Idle(MotionPrimitiveFactory):
 
     def __init__(self, component):
@@ -118,7 +149,7 @@ class Idle(MotionPrimitiveFactory):
         assert(len(args) == 0)
         return StaticIdle(self.name(), self._component)
 
-class StaticIdle(MotionPrimitive):
+class StaticIdle(StaticMotionPrimitive):
 
     def __init__(self, name, component):
         super().__init__(name, component)
@@ -132,16 +163,6 @@ class StaticIdle(MotionPrimitive):
     def preG(self):
         return S.true
 
-    def preFP(self, point):
-        return self._component.abstractResources(point, delta)
-
-    def postFP(self, point):
-        return self._component.abstractResources(point, delta)
-
-    def invFP(self, point):
-        i = self._component.abstractResources(point, delta)
-        return self.timify(i)
-
 class Wait(MotionPrimitiveFactory):
 
     def __init__(self, component):
@@ -158,7 +179,7 @@ class Wait(MotionPrimitiveFactory):
         else:
             assert Fasle, "wrong args " + str(args)
 
-class StaticWait(MotionPrimitive):
+class StaticWait(StaticMotionPrimitive):
 
     def __init__(self, name, component, t_min, t_max = -1):
         super().__init__(name, component)
@@ -176,13 +197,3 @@ class StaticWait(MotionPrimitive):
 
     def preG(self):
         return S.true
-
-    def preFP(self, point):
-        return self._component.abstractResources(point, delta)
-
-    def postFP(self, point):
-        return self._component.abstractResources(point, delta)
-
-    def invFP(self, point):
-        i = self._component.abstractResources(point, delta)
-        return self.timify(i)
@@ -0,0 +1,61 @@
+from utils.vc import *
+import utils.vc
+from sympy import *
+
+import unittest
+
+class VCTests(unittest.TestCase):
+
+    def test_propositional(self):
+        a, b, c = symbols('a b c')
+        self.assertTrue(isPropositional([And(a, Or(Not(b), c))]))
+        self.assertTrue(isPropositional([a, S.true]))
+
+    def test_not_propositional(self):
+        x, y, t = symbols('x y t')
+        f, g = Function('f'), Function('g')
+        self.assertFalse(isPropositional([And(x < y, y < x)]))
+        self.assertFalse(isPropositional([Eq(x, y)]))
+        self.assertFalse(isPropositional([Eq(f(t), g(t))]))
+        self.assertFalse(isPropositional([And(x, y < 0)]))
+
+    def test_propositional_sat(self):
+        a, b = symbols('a b')
+        self.assertTrue(propositionalSat([Or(a, b), Not(a)])[0])
+        self.assertFalse(propositionalSat([And(a, b), Not(a)])[0])
+        self.assertTrue(VC("sat", [Or(a, b)], True).discharge())
+        self.assertTrue(VC("unsat", [And(a, Not(a))]).discharge())
+
+    @unittest.skipIf(utils.vc.Solver == None, "python-sat is not installed")
+    def test_sat_solver(self):
+        n = 20
+        xs = symbols('x0:%d' % (2*n))
+        # disjunction of conjunctions, exponential when converted to CNF by distribution
+        f = Or(*[ And(xs[2*i], xs[2*i+1]) for i in range(n) ])
+        sat, model = propositionalSat([f, Not(xs[0]), Implies(xs[2], Not(xs[3]))])
+        self.assertTrue(sat)
+        self.assertEqual(set(model.keys()), set(xs))
+        self.assertEqual(And(f, Not(xs[0]), Implies(xs[2], Not(xs[3]))).xreplace(model), S.true)
+        sat, model = propositionalSat([f, And(*[ Not(x) for x in xs[::2] ])])
+        self.assertFalse(sat)
+        self.assertEqual(propositionalSat([S.true]), (True, {}))
+
+    def test_sympy_fallback(self):
+        a, b = symbols('a b')
+        solver = utils.vc.Solver
+        try:
+            utils.vc.Solver = None
+            sat, model = propositionalSat([Or(a, b), Not(a)])
+            self.assertTrue(sat)
+            self.assertEqual(model[b], True)
+            self.assertFalse(propositionalSat([And(a, b), Not(b)])[0])
+        finally:
+            utils.vc.Solver = solver
+
+    def test_propositional_implication(self):
+        a, b, c = symbols('a b c')
+        implier = BatchedImplier()
+        self.assertEqual(implier.checkMany(And(a, b), [a, Or(a, c), c, Not(a)]), [True, True, False, False])
+
+if __name__ == '__main__':
+    unittest.main()
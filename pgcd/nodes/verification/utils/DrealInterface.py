@@ -157,6 +157,18 @@ class DrealInterface:
             m2[var] = (lb+ub) / 2
         return m2
 
+    # the logic, the declaration of the variables, and the assertions common to all the queries
+    def writeProblem(self, stream, variables, exprs: List[Expr], printer):
+        self.write(stream, "(set-logic QF_NRA)\n")
+        for var in variables:
+            self.write(stream, "(declare-fun ")
+            self.write(stream, str(var))
+            self.write(stream, " () Real)\n")
+        for exp in exprs:
+            self.write(stream, "(assert ")
+            self.write(stream, printer.doprint(exp))
+            self.write(stream, ")\n")
+
     # https://docs.python.org/3.6/library/subprocess.html
     def run(self, exprs: List[Expr]):
         variables = { v for x in exprs for v in x.free_symbols }
@@ -165,16 +177,7 @@ class DrealInterface:
         command = ["dreal", "--jobs", str(self.jobs), "--precision", str(self.precision), "--model", "--in"]
         proc = Popen(command, stdin=PIPE, stdout=PIPE, stderr=PIPE, universal_newlines=True)
         # print the model
-        self.write(proc.stdin, "(set-logic QF_NRA)\n")
-        for var in variables:
-            self.write(proc.stdin, "(declare-fun ")
-            self.write(proc.stdin, str(var))
-            self.write(proc.stdin, " () Real)\n")
-        for exp in exprs:
-            self.write(proc.stdin, "(assert ")
-            stringExp = printer.doprint(exp)
-            self.write(proc.stdin, stringExp)
-            self.write(proc.stdin, ")\n")
+        self.writeProblem(proc.stdin, variables, exprs, printer)
         self.write(proc.stdin, "(check-sat)\n")
         self.write(proc.stdin, "(exit)\n")
         proc.stdin.flush()
@@ -203,3 +206,50 @@ class DrealInterface:
             outs, errs = proc.communicate() # for clean-up
             return (None, None)
 
+
+    # checks the satisfiability of exprs together with each of the queries, one at a time.
+    # exprs are asserted once and each query goes in its own push/pop scope so one solver does all the work
+    def runBatch(self, exprs: List[Expr], queries: List[Expr]):
+        variables = { v for x in exprs + queries for v in x.free_symbols }
+        printer = DrealPrinter()
+        command = ["dreal", "--jobs", str(self.jobs), "--precision", str(self.precision), "--in"]
+        proc = Popen(command, stdin=PIPE, stdout=PIPE, stderr=PIPE, universal_newlines=True)
+        self.writeProblem(proc.stdin, variables, exprs, printer)
+        for q in queries:
+            self.write(proc.stdin, "(push 1)\n")
+            self.write(proc.stdin, "(assert ")
+            self.write(proc.stdin, printer.doprint(q))
+            self.write(proc.stdin, ")\n")
+            self.write(proc.stdin, "(check-sat)\n")
+            self.write(proc.stdin, "(pop 1)\n")
+        self.write(proc.stdin, "(exit)\n")
+        proc.stdin.flush()
+        try:
+            outs, errs = proc.communicate(timeout=self.timeout)
+            exit_code = proc.wait()
+            if exit_code == 0:
+                log.debug("< %s", outs)
+                results = self.batchResults(outs)
+                if len(results) != len(queries):
+                    raise Exception(outs)
+                return results
+            else:
+                log.warning("< %s", errs)
+                raise Exception(errs)
+        except TimeoutExpired:
+            log.warning("Timeout")
+            proc.kill()
+            outs, errs = proc.communicate() # for clean-up
+            # keep what was answered before the timeout, the other queries are checked one at a time
+            results = self.batchResults(outs)[:len(queries)]
+            return results + [ self.run(exprs + [q])[0] for q in queries[len(results):] ]
+
+    # the answers of a batch, in the order of the queries
+    def batchResults(self, outs):
+        results = []
+        for line in outs.split("\n"):
+            if line.startswith("delta-sat"):
+                results.append(True)
+            elif line.startswith("unsat"):
+                results.append(False)
+        return results
@@ -15,12 +15,35 @@ class CFA():
             log.debug("> starting with %s", self.initLabel)
         self.nextLabel = { l:set() for l in self.programLabels }
         self.buildCFA([], program)
+        # the successor of the labels which have at most one, labels with several (e.g. if) are left out
+        self.next = {}
+        for l, n in self.nextLabel.items():
+            if len(n) == 0:
+                self.next[l] = None
+            elif len(n) == 1:
+                for elt in n:
+                    self.next[l] = elt
         if log.isEnabledFor(logging.DEBUG):
             log.debug("= CFA =")
             for l, s in self.nextLabel.items():
                 log.debug("  %s -> %s", l, s)
 
     def buildCFA(self, lastLabels, statment):
+        # the traversal runs on an explicit stack of generators instead of the call stack:
+        # each _buildCFA yields the sub-statement it needs and gets back the labels it ends with
+        stack = [self._buildCFA(lastLabels, statment)]
+        result = None
+        while len(stack) > 0:
+            try:
+                ls, child = stack[-1].send(result)
+                stack.append(self._buildCFA(ls, child))
+                result = None
+            except StopIteration as stop:
+                stack.pop()
+                result = stop.value
+        return result
+
+    def _buildCFA(self, lastLabels, statment):
         #connect prev
         l = statment.get_label()
         for ls in lastLabels:
@@ -28,21 +51,27 @@ class CFA():
         lastLabel = [l]
         # dig deeper
         if isinstance(statment, ast_inter.Statement):
-            for i in range(0, len(statment.children)):
-                lastLabel = self.buildCFA(lastLabel, statment.children[i])
+            for child in statment.children:
+                lastLabel = yield (lastLabel, child)
         elif isinstance(statment, ast_inter.Receive):
-            ls2 = self.buildCFA(lastLabel, statment.motion)
+            ls2 = yield (lastLabel, statment.motion)
             for l2 in ls2:
                 self.nextLabel[l2].add(l)
-            lastLabel = { l for i in statment.actions for l in self.buildCFA(lastLabel, i) }
+            ends = set()
+            for i in statment.actions:
+                ends.update((yield (lastLabel, i)))
+            lastLabel = ends
         elif isinstance(statment, ast_inter.Action):
-            lastLabel = self.buildCFA(lastLabel, statment.program)
+            lastLabel = yield (lastLabel, statment.program)
         elif isinstance(statment, ast_inter.If):
-            lastLabel = { l for i in statment.if_list for l in self.buildCFA(lastLabel, i) }
+            ends = set()
+            for i in statment.if_list:
+                ends.update((yield (lastLabel, i)))
+            lastLabel = ends
         elif isinstance(statment, ast_inter.IfComponent):
-            lastLabel = self.buildCFA(lastLabel, statment.program)
+            lastLabel = yield (lastLabel, statment.program)
         elif isinstance(statment, ast_inter.While):
-            ls2 = self.buildCFA([], statment.program) # trick: the next of a while is the else case
+            ls2 = yield ([], statment.program) # trick: the next of a while is the else case
             for l2 in ls2:
                 self.nextLabel[l2].add(l)
         return lastLabel
@@ -54,12 +83,7 @@ class CFA():
         return self.programLabels[label]
 
     def nextStatement(self, label):
-        n = self.nextLabel[label]
-        if len(n) == 0:
-            #raise Exception("no successors for " + str(statment))
-            return None
-        elif len(n) > 1:
-            raise Exception("ambiguous successors: " + n + " for " + str(label))
+        if label in self.next:
+            return self.next[label]
         else:
-            for elt in n:
-                return elt
+            raise Exception("ambiguous successors: " + str(self.nextLabel[label]) + " for " + str(label))
@@ -0,0 +1,56 @@
+from sympy import lambdify
+import math
+
+# helpers to evaluate the models on concrete values rather than symbolically
+
+# numba is optional, without it the compiled predicates are plain python functions
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+def compilePredicate(variables, pred):
+    '''turns a predicate over the variables into a function returning a bool'''
+    fct = lambdify(variables, pred, "math")
+    if njit != None:
+        fct = njit(fct)
+    return fct
+
+# Numerical versions of the predicates in utils.geometry, for concrete coordinates.
+# The frame is given by its origin (cx, cy, cz) and a rotation theta around z, i.e., the k axis is vertical.
+
+def _compiled(fct):
+    if njit != None:
+        return njit(fct)
+    return fct
+
+@_compiled
+def cylinderHolds(cx, cy, cz, radius, height, px, py, pz, maxError = 0.0):
+    proj = pz - cz
+    return proj >= -maxError and proj <= height + maxError and math.sqrt((px-cx)**2 + (py-cy)**2) <= radius + maxError
+
+@_compiled
+def cubeHolds(cx, cy, cz, theta, lx, ly, lz, ux, uy, uz, px, py, pz, maxErrorX = 0.0, maxErrorY = 0.0, maxErrorZ = 0.0):
+    '''lower and upper corners in the coordinates of the frame'''
+    c = math.cos(theta)
+    s = math.sin(theta)
+    vx = c * (px - cx) + s * (py - cy)
+    vy = -s * (px - cx) + c * (py - cy)
+    vz = pz - cz
+    return (abs(vx - (lx + ux) / 2) <= abs(ux - lx) / 2 + maxErrorX and
+            abs(vy - (ly + uy) / 2) <= abs(uy - ly) / 2 + maxErrorY and
+            abs(vz - (lz + uz) / 2) <= abs(uz - lz) / 2 + maxErrorZ)
+
+@_compiled
+def semiRegularHexagonHolds(cx, cy, cz, theta, centerToSide1, centerToSide2, height, px, py, pz, maxError = 0.0):
+    c = math.cos(theta)
+    s = math.sin(theta)
+    vx = c * (px - cx) + s * (py - cy)
+    vy = -s * (px - cx) + c * (py - cy)
+    vz = pz - cz
+    o1 = -centerToSide1 - maxError
+    o2 = -centerToSide2 - maxError
+    return (-0.5 * vx - 0.866 * vy >= o1 and 0.5 * vx + 0.866 * vy >= o2 and
+            -0.5 * vx + 0.866 * vy >= o1 and 0.5 * vx - 0.866 * vy >= o2 and
+            vx >= o1 and -vx >= o2 and
+            vz >= -maxError and vz <= height + maxError)
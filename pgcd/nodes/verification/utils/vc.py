@@ -1,9 +1,15 @@
 from utils.DrealInterface import DrealInterface
 from sympy import *
-from sympy.logic.boolalg import to_nnf
+from sympy.logic.boolalg import to_nnf, BooleanAtom, BooleanFunction
 import spec.conf
 import logging
 
+# python-sat is optional, without it the propositional VCs use sympy's own sat solver
+try:
+    from pysat.solvers import Solver
+except ImportError:
+    Solver = None
+
 log = logging.getLogger("VC")
 
 
@@ -22,6 +28,82 @@ def conjContains(conj1, conj2):
     return res
 
 
+def _isBoolean(f):
+    if isinstance(f, (Symbol, BooleanAtom)):
+        return True
+    # relations, applied functions, and arithmetic are not BooleanFunction
+    return isinstance(f, BooleanFunction) and all(_isBoolean(a) for a in f.args)
+
+def isPropositional(formulas):
+    '''the formulas only combine boolean symbols with logical connectives, no arithmetic involved'''
+    return all(_isBoolean(f) for f in formulas)
+
+# Tseitin encoding: a fresh variable for each connective, so the clauses grow linearly with the formula.
+# (to_cnf distributes Or over And and blows up exponentially on disjunctions of conjunctions)
+class _Tseitin:
+
+    def __init__(self):
+        self.index = {} # symbol -> variable
+        self.literals = {} # sub-formula -> literal
+        self.clauses = []
+        self.nVars = 0
+
+    def _fresh(self):
+        self.nVars += 1
+        return self.nVars
+
+    def literal(self, f):
+        if not f in self.literals:
+            self.literals[f] = self._encode(f)
+        return self.literals[f]
+
+    def _encode(self, f):
+        if isinstance(f, Symbol):
+            v = self._fresh()
+            self.index[f] = v
+            return v
+        elif isinstance(f, BooleanAtom):
+            v = self._fresh()
+            self.clauses.append([v] if f == S.true else [-v])
+            return v
+        elif isinstance(f, Not):
+            return -self.literal(f.args[0])
+        elif isinstance(f, (And, Or)):
+            args = [ self.literal(a) for a in f.args ]
+            v = self._fresh()
+            if isinstance(f, And):
+                self.clauses.extend([-v, a] for a in args)
+                self.clauses.append([v] + [-a for a in args])
+            else:
+                self.clauses.append([-v] + args)
+                self.clauses.extend([v, -a] for a in args)
+            return v
+        else:
+            # Implies, Equivalent, etc.
+            return self.literal(to_nnf(f, simplify = False))
+
+# returns (sat, model) for a list of propositional formulas
+def propositionalSat(formulas):
+    f = And(*formulas)
+    if Solver == None:
+        model = satisfiable(f)
+        if model == False:
+            return (False, None)
+        return (True, model)
+    if f == S.true:
+        return (True, {})
+    if f == S.false:
+        return (False, None)
+    # the SAT solver works on integers
+    enc = _Tseitin()
+    enc.clauses.append([enc.literal(f)])
+    with Solver(name = 'g3', bootstrap_with = enc.clauses) as solver:
+        if solver.solve():
+            model = solver.get_model()
+            return (True, { x: model[v-1] > 0 for x, v in enc.index.items() })
+        return (False, None)
+
+
 class VC:
 
     def __init__(self, title, formulas, shouldBeSat = False):
@@ -32,6 +114,8 @@ class VC:
         self.formulas = [ to_nnf(f) for f in formulas ]
         self.sat = shouldBeSat
         self.model = None
+        # whether the solver gave up (timeout) on the last discharge
+        self.unknown = False
 
     def __str__(self):
         sat = ""
@@ -56,6 +140,11 @@ class VC:
             return False
         elif trivialSat:
             return True
+        elif isPropositional(formula):
+            # no need to start dReal for that
+            res, model = propositionalSat(formula)
+            self.model = model
+            return res
         else:
             #TODO take out variables which are not important: the ones only appearing in bound cstrs (careful may be unsat)
             # split the formula into bound cstr and other cstr
@@ -77,6 +166,7 @@ class VC:
 
     def discharge(self, timeout = spec.conf.dRealTimeout):
         log.debug("VC: %s (%s)", self.title, "sat" if self.sat else "unsat")
+        self.unknown = False
         for f in self.formulas:
             #f2 = to_cnf(f)
             f3 = list(And.make_args(f))
@@ -85,8 +175,45 @@ class VC:
                     log.debug("  %s", f)
             res = self._trivialOrSovler(f3, timeout)
             if res == None:
+                self.unknown = True
                 return False
             elif res == self.sat:
                 return True
         return False
 
+
+
+# checks many implications sharing the same premise with a single solver process
+class BatchedImplier:
+
+    def __init__(self, timeout = spec.conf.dRealTimeout):
+        self.timeout = timeout
+
+    def checkMany(self, cond, conclusions):
+        '''returns, for each conclusion, whether cond implies it (None when the solver timed out)'''
+        premise = [ c for c in And.make_args(to_nnf(cond)) if c != S.true ]
+        if S.false in premise:
+            return [ True for c in conclusions ]
+        results = [ None for c in conclusions ]
+        queries = []
+        for i, c in enumerate(conclusions):
+            q = to_nnf(Not(c))
+            if q == S.false:
+                results[i] = True
+            elif q == S.true and len(premise) == 0:
+                results[i] = False
+            elif isPropositional(premise + [q]):
+                sat, model = propositionalSat(premise + [q])
+                results[i] = not sat
+            else:
+                queries.append( (i, q) )
+        if len(queries) > 0:
+            log.debug("VC: %d implications from %s", len(queries), cond)
+            dr = DrealInterface(precision = spec.conf.dRealPrecision,
+                                timeout = self.timeout,
+                                jobs = spec.conf.dRealJobs)
+            sat = dr.runBatch(premise, [ q for i, q in queries ])
+            for (i, q), s in zip(queries, sat):
+                # unsat means the implication holds
+                results[i] = None if s == None else s == False
+        return results